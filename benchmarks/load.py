@@ -0,0 +1,333 @@
+"""Simulates many channels playing at the same time through the whole message
+pipeline (on_message, workers, rendering, send scheduler) without connecting to discord,
+and reports throughput, response latency and event loop lag
+
+Usage: python -m benchmarks.load [--channels 2000] [--duration 20] [--lists Wordle] ...
+
+Each channel plays games one after another: it starts a game, guesses (a random
+word of its list, or the answer with --solve-chance or after --max-guesses),
+sometimes changes its word list or length, and waits --think seconds on average
+between messages. Games and statistics are kept in memory unless --state-database
+is given."""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import types
+
+try:
+    import config
+except ImportError:
+    config = sys.modules["config"] = types.ModuleType("config")
+
+# Games and statistics are kept in memory unless --state-database is given
+# (see main()), the bot's own state store is never used
+config.STATE_BACKEND = None
+
+# Seconds between event loop lag measurements
+LAG_INTERVAL = 0.01
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeChannel:
+    """Channel whose messages take upload_time seconds to send"""
+
+    upload_time = 0.05
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+    async def send(self, embed=None, file=None):
+        await asyncio.sleep(self.upload_time)
+
+
+class FakeAuthor:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, channel, guild, content, author):
+        self.channel = channel
+        self.guild = guild
+        self.content = content
+        self.author = author
+        self.attachments = []
+
+
+class Recorder:
+    """Latencies of handled messages and sent responses, and event loop lag"""
+
+    def __init__(self):
+        self.handled = []  # Seconds from receiving a message to handling it
+        self.sent = []  # Seconds from receiving a message to its response being sent
+        self.lag = []  # Seconds the event loop was late to wake up a task
+        self.commands = {}
+        self.responses = {}  # Send futures by channel ID, see RecordingScheduler
+
+    def record(self, command, start, sent):
+        """Records a handled message, and its response once it's sent
+        (responses that are replaced by newer ones aren't counted)"""
+        self.commands[command] = self.commands.get(command, 0) + 1
+        self.handled.append(time.perf_counter() - start)
+
+        def record_sent(future):
+            if future.result():
+                self.sent.append(time.perf_counter() - start)
+
+        if sent is not None:
+            sent.add_done_callback(record_sent)
+
+    async def measure_lag(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lag.append(time.perf_counter() - before - LAG_INTERVAL)
+
+
+def make_scheduler(sending, recorder):
+    """Returns a send scheduler that remembers the last response of each channel"""
+
+    class RecordingScheduler(sending.SendScheduler):
+        def send(self, channel, embed, file=None, replaceable=False):
+            sent = super().send(channel, embed, file, replaceable)
+            recorder.responses[channel.id] = sent
+            return sent
+
+    return RecordingScheduler(
+        sending.SEND_RATE, sending.SEND_BURST, sending.MAX_UPLOADS
+    )
+
+
+class Player:
+    """Plays games in one channel"""
+
+    def __init__(self, bot, args, settings, recorder, rng, channel_id):
+        self.bot = bot
+        self.args = args
+        self.settings = settings
+        self.recorder = recorder
+        self.rng = rng
+        self.channel = FakeChannel(channel_id)
+        self.guild = FakeGuild(channel_id // args.channels_per_guild)
+        # Players of the guild, each message is sent by one of them
+        self.authors = [
+            FakeAuthor(self.guild.id * args.players + i) for i in range(args.players)
+        ]
+
+    async def say(self, command, content):
+        self.recorder.responses.pop(self.channel.id, None)
+        start = time.perf_counter()
+        await self.bot.on_message(
+            FakeMessage(
+                self.channel, self.guild, content, self.rng.choice(self.authors)
+            )
+        )
+        self.recorder.record(
+            command, start, self.recorder.responses.pop(self.channel.id, None)
+        )
+
+    async def play(self, deadline):
+        args = self.args
+        # Spread the channels' first messages over the first think time
+        await asyncio.sleep(self.rng.uniform(0, args.think))
+        await self.change_settings()
+        while True:
+            delay = self.rng.expovariate(1 / args.think)
+            if time.perf_counter() + delay > deadline:
+                return
+            await asyncio.sleep(delay)
+            state = self.bot.wordle_states.get(self.channel.id)
+            game = state.game
+            if game is None or game.won:
+                if self.rng.random() < args.settings_chance:
+                    await self.change_settings()
+                await self.say("new", "wortlerino")
+            else:
+                await self.say("guess", f"wortlerino {self.pick_guess(state, game)}")
+
+    async def change_settings(self):
+        list_name, length = self.rng.choice(self.settings)
+        await self.say("setting", f"wortlerino word_list {list_name}")
+        await self.say("setting", f"wortlerino guess_list {list_name}")
+        await self.say("setting", f"wortlerino length {length}")
+
+    def pick_guess(self, state, game):
+        """Returns the answer or a random word of the game's list and length"""
+        answer = game.words[0]
+        if (
+            self.rng.random() < self.args.solve_chance
+            or len(game.guesses) >= self.args.max_guesses - 1
+        ):
+            return answer
+        loaded = self.bot.word_lists.cache.get(state.word_list)
+        bucket = loaded.get_buckets(state.valid_letters["letters"])[len(answer)]
+        return bucket[self.rng.randrange(len(bucket))]
+
+
+def percentiles(values):
+    """Returns p50, p90, p99 and max of some values in milliseconds"""
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        name: values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1))
+    }
+
+
+async def run(args):
+    import metrics  # pylint: disable=import-outside-toplevel
+    import sending  # pylint: disable=import-outside-toplevel
+    import workers  # pylint: disable=import-outside-toplevel
+    import wortlerino  # pylint: disable=import-outside-toplevel
+
+    recorder = Recorder()
+    wortlerino.sending.scheduler = make_scheduler(sending, recorder)
+    FakeChannel.upload_time = args.upload_time
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    # Loading word lists is measured by benchmarks.run, not here
+    settings = []
+    for list_name in args.lists:
+        state = wortlerino.wordle.WordleState()
+        state.set_word_list(list_name)
+        buckets = wortlerino.word_lists.cache.get(state.word_list).get_buckets(
+            state.valid_letters["letters"]
+        )
+        settings += [
+            (list_name, length) for length in args.lengths if length in buckets
+        ]
+    if not settings:
+        sys.exit("None of the lists has words of these lengths")
+    if args.state_database:
+        wortlerino.wordle_states.start_flushing(
+            wortlerino.state_store.STATE_FLUSH_INTERVAL
+        )
+        wortlerino.game_stats.stats.start_flushing(
+            wortlerino.game_stats.STATS_FLUSH_INTERVAL
+        )
+
+    lag_task = asyncio.get_running_loop().create_task(recorder.measure_lag())
+    players = [
+        Player(
+            wortlerino,
+            args,
+            settings,
+            recorder,
+            random.Random(rng.random()),
+            channel_id,
+        )
+        for channel_id in range(args.channels)
+    ]
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            # The bot prints every message it handles
+            stack.enter_context(
+                contextlib.redirect_stdout(
+                    stack.enter_context(open(os.devnull, "w", encoding="UTF-8"))
+                )
+            )
+        await asyncio.gather(
+            *(player.play(start + args.duration) for player in players)
+        )
+    handled = time.perf_counter() - start
+    await wortlerino.sending.scheduler.drain()
+    lag_task.cancel()
+
+    messages = len(recorder.handled)
+    return {
+        "channels": args.channels,
+        "messages": messages,
+        "commands": recorder.commands,
+        "seconds": handled,
+        "messages_per_sec": messages / handled,
+        "handled_ms": percentiles(recorder.handled),
+        "sent_ms": percentiles(recorder.sent),
+        "boards_replaced": wortlerino.sending.scheduler.dropped,
+        "event_loop_lag_ms": percentiles(recorder.lag),
+        "max_worker_queue": workers.pool.max_queued,
+        "boards": metrics.boards.snapshot(),
+        "rejections": metrics.rejections.snapshot(),
+        "games_won": sum(metrics.games_won.snapshot().values()),
+        "image_cache": metrics.image_cache.snapshot(),
+    }
+
+
+def print_results(results):
+    def format_percentiles(values):
+        return "  ".join(f"{name} {value:8.1f}ms" for name, value in values.items())
+
+    print(
+        f"{results['messages']} messages in {results['channels']} channels"
+        f" in {results['seconds']:.1f}s: {results['messages_per_sec']:.1f} messages/s"
+    )
+    print(f"commands:          {results['commands']}")
+    print(f"handled:           {format_percentiles(results['handled_ms'])}")
+    print(f"response sent:     {format_percentiles(results['sent_ms'])}")
+    print(f"event loop lag:    {format_percentiles(results['event_loop_lag_ms'])}")
+    print(f"boards:            {results['boards']}")
+    print(f"boards replaced:   {results['boards_replaced']}")
+    print(f"rejections:        {results['rejections']}")
+    print(f"games won:         {results['games_won']}")
+    print(f"image cache:       {results['image_cache']}")
+    print(f"max worker queue:  {results['max_worker_queue']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=2000)
+    parser.add_argument("--channels-per-guild", type=int, default=10)
+    parser.add_argument("--players", type=int, default=5, help="per guild")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--lists", nargs="+", default=["Wordle"])
+    parser.add_argument("--lengths", nargs="+", type=int, default=[5])
+    parser.add_argument(
+        "--think", type=float, default=5, help="average seconds between messages"
+    )
+    parser.add_argument("--solve-chance", type=float, default=0.2)
+    parser.add_argument("--max-guesses", type=int, default=6)
+    parser.add_argument(
+        "--settings-chance",
+        type=float,
+        default=0.1,
+        help="chance to change settings before a new game",
+    )
+    parser.add_argument(
+        "--upload-time", type=float, default=0.05, help="seconds each send takes"
+    )
+    parser.add_argument("--workers", type=int, help="default: MAX_WORKERS")
+    parser.add_argument(
+        "--state-database", help="save games in this SQLite file (default: memory)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument(
+        "--verbose", action="store_true", help="show what the bot prints"
+    )
+    args = parser.parse_args()
+
+    config.STATE_DATABASE = args.state_database
+    if args.workers:
+        config.MAX_WORKERS = args.workers
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="UTF-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measures the memory used per game with many games running at the same time
+
+Usage: python -m benchmarks.memory [number of games] [guesses per game]"""
+
+import collections
+import random
+import sys
+import tracemalloc
+import types
+
+try:
+    import config  # pylint: disable=unused-import
+except ImportError:
+    sys.modules["config"] = types.ModuleType("config")
+
+import wordle
+import word_lists
+from wordle_guess import Guess, LetterGuess
+
+
+class LegacyWordleGame:
+    """The original game representation: a set of valid letters and guessed letters
+    per game, and each guess stored as a list of new LetterGuess instances"""
+
+    def __init__(self, word, valid_letters, valid_words):
+        self.word = word
+        self.valid_words = valid_words
+        self.valid_letters = valid_letters
+        self.guessed_letters = set()
+        self.guesses = []
+        self.won = False
+
+    def guess(self, guess):
+        self.guessed_letters.update(guess)
+        result = [LetterGuess(c, Guess.INCORRECT) for c in guess]
+        count = collections.Counter(self.word)
+        for i, c in enumerate(guess):
+            if self.word[i] == c:
+                result[i] = LetterGuess(c, Guess.CORRECT)
+                count[c] -= 1
+        for i, c in enumerate(guess):
+            if result[i].guess == Guess.INCORRECT and count[c] > 0:
+                result[i] = LetterGuess(c, Guess.WRONG_POSITION)
+                count[c] -= 1
+        self.guesses.append(result)
+
+
+def measure(create_game, words, number, guesses):
+    """Returns bytes allocated per game for number games with guesses each"""
+    rng = random.Random(0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = []
+    for _ in range(number):
+        game = create_game(rng.choice(words))
+        for _ in range(guesses):
+            if not game.won:
+                game.guess(rng.choice(words))
+        games.append(game)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / number
+
+
+def main(number=10_000, guesses=4):
+    word_list = word_lists.cache.get(wordle.WORD_LISTS["Wordle"])
+    guess_list = word_lists.cache.get(wordle.WORD_LISTS["Wordle-all"])
+    letters = wordle.LETTERS["English"]["letters"]
+    words = list(word_list.get_buckets(letters)[5])
+
+    legacy = measure(
+        lambda word: LegacyWordleGame(
+            word, set(letters), wordle.WordSetUnion(guess_list, word_list)
+        ),
+        words,
+        number,
+        guesses,
+    )
+    current = measure(
+        lambda word: wordle.WordleGame(
+            word, letters, wordle.get_valid_words(guess_list, word_list)
+        ),
+        words,
+        number,
+        guesses,
+    )
+    print(f"{number} games with {guesses} guesses each")
+    print(
+        f"legacy:  {legacy:8.0f} bytes per game, {legacy * number / 1e6:6.1f} MB total"
+    )
+    print(
+        f"current: {current:8.0f} bytes per game, {current * number / 1e6:6.1f} MB total"
+    )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
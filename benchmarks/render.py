@@ -0,0 +1,204 @@
+"""Compares per-guess render time of the board renderers, and size and time of each output format
+
+Usage: python -m benchmarks.render [number of guesses] [word length]"""
+
+import io
+import random
+import sys
+import time
+import types
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+try:
+    import config  # pylint: disable=unused-import
+except ImportError:
+    sys.modules["config"] = types.ModuleType("config")
+
+import image_guesses
+from wordle_guess import Guess, LetterGuess
+
+REPEATS = 20
+
+# Output formats as name -> (image format, PNG compression level, WebP method)
+FORMATS = {
+    "png level 1": ("png", 1, None),
+    "png level 6": ("png", 6, None),
+    "png level 9": ("png", 9, None),
+    "webp method 0": ("webp", None, 0),
+    "webp method 4": ("webp", None, 4),
+    "webp method 6": ("webp", None, 6),
+}
+
+TEXT_SQUARES = {Guess.CORRECT: "🟩", Guess.WRONG_POSITION: "🟨", Guess.INCORRECT: "⬜"}
+
+
+def legacy_render(guesses):
+    """The original renderer: rasterizes every letter of every row on each call"""
+    width, height = image_guesses.get_dimensions(guesses)
+    out_img = Image.new("RGBA", (width, height))
+    img_draw = ImageDraw.Draw(out_img)
+    for attempt_idx, attempt in enumerate(guesses):
+        for guess_idx, guess in enumerate(attempt):
+            x0 = (
+                (guess_idx * image_guesses.SQUARE_WIDTH)
+                + (image_guesses.GAP * (guess_idx))
+                + image_guesses.GAP
+            )
+            y0 = (
+                (attempt_idx * image_guesses.SQUARE_HEIGHT)
+                + (image_guesses.GAP * (attempt_idx))
+                + image_guesses.GAP
+            )
+            x1 = x0 + image_guesses.SQUARE_WIDTH - 1
+            y1 = y0 + image_guesses.SQUARE_HEIGHT - 1
+            img_draw.rounded_rectangle(
+                [x0, y0, x1, y1], fill=image_guesses.get_color(guess.guess), radius=0
+            )
+            text = guess.letter.upper()
+            _, offset, font_width, font_height = image_guesses.IMG_FONT.getbbox(text)
+            img_draw.text(
+                (
+                    x0 + (image_guesses.SQUARE_WIDTH - font_width) / 2,
+                    y0 + (image_guesses.SQUARE_HEIGHT - font_height) / 2 - offset + 8,
+                ),
+                text,
+                font=image_guesses.IMG_FONT,
+                fill=(255, 255, 255),
+            )
+    buf = io.BytesIO()
+    out_img.save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def random_guesses(number, length, seed=0):
+    """Creates random guess rows"""
+    rng = random.Random(seed)
+    return [
+        [
+            LetterGuess(
+                rng.choice("abcdefghijklmnopqrstuvwxyz"), rng.choice(list(Guess))
+            )
+            for _ in range(length)
+        ]
+        for _ in range(number)
+    ]
+
+
+def time_game(render_game, guesses):
+    """Returns the average time in ms for each guess of a game"""
+    totals = [0.0] * len(guesses)
+    for _ in range(REPEATS):
+        for i, duration in enumerate(render_game(guesses)):
+            totals[i] += duration
+    return [total / REPEATS * 1000 for total in totals]
+
+
+def play(render):
+    """Renders a game guess by guess with a stateless render function"""
+
+    def render_game(guesses):
+        durations = []
+        for i in range(1, len(guesses) + 1):
+            start = time.perf_counter()
+            render(guesses[:i])
+            durations.append(time.perf_counter() - start)
+        return durations
+
+    return render_game
+
+
+def play_incremental(guesses):
+    """Renders a game guess by guess with one renderer for the whole game"""
+    renderer = image_guesses.BoardRenderer()
+    durations = []
+    for i in range(1, len(guesses) + 1):
+        start = time.perf_counter()
+        renderer.render(guesses[:i])
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def play_format(image_format):
+    """Renders a game guess by guess in an output format, remembering the last image"""
+
+    def render_game(guesses):
+        renderer = image_guesses.BoardRenderer(image_format)
+        durations = []
+        for i in range(1, len(guesses) + 1):
+            start = time.perf_counter()
+            image = renderer.render(guesses[:i])
+            durations.append(time.perf_counter() - start)
+        render_game.last = image.getvalue()
+        return durations
+
+    return render_game
+
+
+def play_text(guesses):
+    """Writes a game guess by guess as emoji text, remembering the last text"""
+    durations = []
+    for i in range(1, len(guesses) + 1):
+        start = time.perf_counter()
+        text = image_guesses.get_text_from_guesses(guesses[:i], TEXT_SQUARES)
+        durations.append(time.perf_counter() - start)
+    play_text.last = text.encode("UTF-8")
+    return durations
+
+
+def max_difference(first, second):
+    """Returns the biggest difference of a color channel between two images"""
+    first = np.asarray(Image.open(first).convert("RGBA"), dtype=int)
+    second = np.asarray(Image.open(second).convert("RGBA"), dtype=int)
+    return np.abs(first - second).max()
+
+
+def main(number=12, length=5):
+    guesses = random_guesses(number, length)
+    # Palette shades may be off by a rounding step from the original colors
+    for image_format in ("png", "webp"):
+        assert (
+            max_difference(
+                legacy_render(guesses),
+                image_guesses.BoardRenderer(image_format).render(guesses),
+            )
+            <= 2
+        ), f"{image_format} renderer differs from the original image"
+
+    results = {
+        "legacy": time_game(play(legacy_render), guesses),
+        "full redraw": time_game(play(image_guesses.get_image_from_guesses), guesses),
+        "incremental": time_game(play_incremental, guesses),
+    }
+    print("guess  " + "".join(f"{name:>14}" for name in results))
+    for i in range(number):
+        print(
+            f"{i + 1:>5}  "
+            + "".join(f"{times[i]:>12.2f}ms" for times in results.values())
+        )
+    print("total  " + "".join(f"{sum(times):>12.2f}ms" for times in results.values()))
+
+    print()
+    print(f"{'format':<15}{'size':>10}{'last guess':>14}{'whole game':>14}")
+    times = time_game(play(legacy_render), guesses)
+    print_format("legacy rgba png", len(legacy_render(guesses).getvalue()), times)
+    level, method = image_guesses.PNG_COMPRESSION_LEVEL, image_guesses.WEBP_METHOD
+    for name, (image_format, new_level, new_method) in FORMATS.items():
+        image_guesses.PNG_COMPRESSION_LEVEL = new_level or level
+        image_guesses.WEBP_METHOD = new_method or 0
+        render_game = play_format(image_format)
+        times = time_game(render_game, guesses)
+        print_format(name, len(render_game.last), times)
+    image_guesses.PNG_COMPRESSION_LEVEL, image_guesses.WEBP_METHOD = level, method
+    times = time_game(play_text, guesses)
+    print_format("emoji text", len(play_text.last), times)
+
+
+def print_format(name, size, times):
+    print(f"{name:<15}{size:>9}B{times[-1]:>12.2f}ms{sum(times):>12.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,213 @@
+"""Benchmarks game creation, guess validation, scoring and rendering per word list and length
+
+Runs offline without discord. Results can be saved as JSON and compared:
+    python -m benchmarks.run --json results.json
+    python -m benchmarks.run --compare old.json new.json"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+try:
+    import config  # pylint: disable=unused-import
+except ImportError:
+    # No bot token needed, all settings keep their defaults
+    sys.modules["config"] = types.ModuleType("config")
+
+import image_guesses
+import word_lists
+import wordle
+
+WORD_LISTS = ["Wordle", "Wordle-all", "Spelunky", "English"]
+LENGTHS = [4, 5, 6, 8]
+GUESSES_PER_BOARD = 6
+
+# Minimum time and iterations spent on each benchmark
+MIN_TIME = 0.2
+MIN_ITERATIONS = 20
+MEMORY_ITERATIONS = 20
+
+
+def get_cases(list_name, length, rng):
+    """Returns the benchmarks for one word list and length as name -> function,
+    or None if the list has no words of that length"""
+    state = wordle.WordleState()
+    state.set_word_list(list_name)
+    state.set_guess_list(list_name)
+    state.set_length(length, length)
+    loaded = word_lists.cache.get(state.word_list)
+    words = loaded.get_buckets(state.valid_letters["letters"]).get(length)
+    if not words:
+        return None
+    words = [words[rng.randrange(len(words))] for _ in range(200)]
+    state.create_game()
+    game = state.game
+    guesses = [game._analyze_guess(word) for word in words[:GUESSES_PER_BOARD]]
+
+    def check_valid_guess():
+        game._check_valid_guess(rng.choice(words))
+
+    def analyze_guess():
+        game._analyze_guess(rng.choice(words))
+
+    def render_incremental():
+        renderer = image_guesses.BoardRenderer()
+        for i in range(1, len(guesses) + 1):
+            renderer.render(guesses[:i])
+
+    def get_buckets():
+        """Finds the eligible words of the alphabet again"""
+        loaded.buckets.pop(state.valid_letters["letters"], None)
+        loaded.get_buckets(state.valid_letters["letters"])
+
+    def play_boards(count):
+        """Scores a game's guesses on several boards at once, and renders them"""
+        distinct = list(dict.fromkeys(words))
+        multi_game = wordle.MultiWordleGame(
+            distinct[:count], game.valid_letters, game.valid_words
+        )
+        renderer = image_guesses.MultiBoardRenderer()
+        for guess in distinct[count : count + GUESSES_PER_BOARD]:
+            multi_game._add_guess(guess)
+            renderer.render(multi_game.boards)
+
+    cases = {
+        "create_game": state.create_game,
+        "get_new_word": lambda: state._get_new_word(loaded),
+        "check_valid_guess": check_valid_guess,
+        "analyze_guess": analyze_guess,
+        "render_board": lambda: image_guesses.get_image_from_guesses(guesses),
+        "render_game_incremental": render_incremental,
+        "play_game_1_board": lambda: play_boards(1),
+        "play_game_4_boards": lambda: play_boards(4),
+        "play_game_8_boards": lambda: play_boards(8),
+    }
+    if hasattr(loaded, "masks"):
+        # Word graphs find eligible words while walking the graph, which takes long
+        cases["get_buckets"] = get_buckets
+    return cases
+
+
+def measure(func):
+    """Returns ops/sec, latency percentiles and peak memory of a function"""
+    func()  # Warm up caches
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < MIN_ITERATIONS or time.perf_counter() - start < MIN_TIME:
+        before = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - before)
+    timings.sort()
+
+    tracemalloc.start()
+    for _ in range(MEMORY_ITERATIONS):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": len(timings),
+        "ops_per_sec": len(timings) / sum(timings),
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6,
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(list_names, lengths):
+    """Runs all benchmarks, returns the results by "benchmark/word list/length" """
+    rng = random.Random(0)
+    random.seed(0)
+    results = {}
+    for list_name in list_names:
+        for length in lengths:
+            try:
+                cases = get_cases(list_name, length, rng)
+            except wordle.InvalidSettingsException as ex:
+                print(f"Skipping {list_name}: {ex}", file=sys.stderr)
+                break
+            if cases is None:
+                continue
+            for name, func in cases.items():
+                key = f"{name}/{list_name}/{length}"
+                results[key] = measure(func)
+                print_result(key, results[key])
+    return results
+
+
+def print_result(key, result):
+    print(
+        f"{key:<45} {result['ops_per_sec']:>12.1f} ops/s"
+        f"  p50 {result['p50_us']:>10.1f}us  p99 {result['p99_us']:>10.1f}us"
+        f"  peak {result['peak_memory_bytes'] / 1024:>9.1f}KiB"
+    )
+
+
+def compare(old, new, threshold):
+    """Prints the change of each benchmark between two runs,
+    returns the keys that got slower by more than threshold"""
+    regressions = []
+    for key in sorted(set(old["results"]) & set(new["results"])):
+        old_p50 = old["results"][key]["p50_us"]
+        new_p50 = new["results"][key]["p50_us"]
+        change = (new_p50 - old_p50) / old_p50
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressions.append(key)
+        print(
+            f"{key:<45} p50 {old_p50:>10.1f}us -> {new_p50:>10.1f}us ({change:+.1%}){marker}"
+        )
+    only_old = len(set(old["results"]) - set(new["results"]))
+    only_new = len(set(new["results"]) - set(old["results"]))
+    if only_old or only_new:
+        print(f"Not compared: {only_old} only in old run, {only_new} only in new run")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lists", nargs="+", default=WORD_LISTS)
+    parser.add_argument("--lengths", nargs="+", type=int, default=LENGTHS)
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved runs"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative p50 slowdown counted as regression when comparing (default: 0.1)",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="UTF-8") as file:
+            old = json.load(file)
+        with open(args.compare[1], encoding="UTF-8") as file:
+            new = json.load(file)
+        regressions = compare(old, new, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    results = run(args.lists, args.lengths)
+    if args.json:
+        with open(args.json, "w", encoding="UTF-8") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.time(),
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Sends bursts of boards to fake channels through the send scheduler and reports
+how many were sent or replaced, the highest rate per channel and the most parallel uploads
+
+Usage: python -m benchmarks.sending [channels] [messages per channel]"""
+
+import asyncio
+import sys
+import time
+import types
+
+try:
+    import config  # pylint: disable=unused-import
+except ImportError:
+    sys.modules["config"] = types.ModuleType("config")
+
+import sending
+
+# Scheduler settings for the benchmark, faster than discord's to keep it short
+RATE = 20
+BURST = 5
+MAX_UPLOADS = 8
+
+# Seconds a fake upload takes, and between a channel's messages
+UPLOAD_TIME = 0.02
+MESSAGE_INTERVAL = 0.005
+
+
+class FakeFile:
+    filename = "guesses.png"
+
+
+class FakeChannel:
+    """Channel that takes some time for each message and records when it got them"""
+
+    uploading = 0
+    max_uploading = 0
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.received = []
+
+    async def send(self, embed=None, file=None):
+        if file is not None:
+            FakeChannel.uploading += 1
+            FakeChannel.max_uploading = max(
+                FakeChannel.max_uploading, FakeChannel.uploading
+            )
+        try:
+            await asyncio.sleep(UPLOAD_TIME)
+        finally:
+            if file is not None:
+                FakeChannel.uploading -= 1
+        self.received.append((time.monotonic(), embed))
+
+
+def highest_rate(times):
+    """Returns the most messages a channel got within any second after its burst"""
+    highest = 0
+    for i, start in enumerate(times):
+        highest = max(highest, sum(1 for t in times[i:] if t - start < 1))
+    return highest
+
+
+async def run(channel_count=200, message_count=20):
+    scheduler = sending.SendScheduler(RATE, BURST, MAX_UPLOADS)
+    channels = [FakeChannel(i) for i in range(channel_count)]
+
+    async def guess(channel):
+        # Boards of a running game, then the last one wins the game
+        results = []
+        for i in range(message_count):
+            last = i == message_count - 1
+            results.append(scheduler.send(channel, i, FakeFile(), replaceable=not last))
+            await asyncio.sleep(MESSAGE_INTERVAL)
+        return await asyncio.gather(*results)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*map(guess, channels))
+    await scheduler.drain()
+    duration = time.perf_counter() - start
+
+    sent = sum(result.count(True) for result in results)
+    print(f"channels {channel_count}, messages {channel_count * message_count}")
+    print(f"sent {sent}, replaced by newer boards {scheduler.dropped}")
+    print(f"all final boards sent: {all(result[-1] for result in results)}")
+    print(
+        f"in order: {all(c.received == sorted(c.received, key=lambda r: r[1]) for c in channels)}"
+    )
+    print(
+        f"highest messages per second in a channel: "
+        f"{max(highest_rate([t for t, _ in c.received]) for c in channels)}"
+        f" (limit {RATE} + burst {BURST})"
+    )
+    print(f"most uploads at once: {FakeChannel.max_uploading} (limit {MAX_UPLOADS})")
+    print(f"took {duration:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(*map(int, sys.argv[1:])))
@@ -0,0 +1,30 @@
+"""Compiles the word lists into the memory-mapped format loaded by word_lists.py
+
+Usage: python compile_word_lists.py [--graph] [filename ...]
+Without filenames, all text files in the word list directory are compiled.
+With --graph, they are compiled into word graphs (see dawg.py), which are smaller
+and are loaded instead of the other compiled format if both exist"""
+
+import glob
+import sys
+
+import word_lists
+
+
+def main(filenames, graph=False):
+    """Compiles the given word list files, or all of them"""
+    if not filenames:
+        filenames = sorted(glob.glob(word_lists.WORD_LIST_DIR + "*.txt"))
+    for filename in filenames:
+        if graph:
+            word_lists.compile_word_graph(filename)
+            compiled_filename = word_lists.get_graph_filename(filename)
+        else:
+            word_lists.compile_word_list(filename)
+            compiled_filename = word_lists.get_compiled_filename(filename)
+        print("Compiled", filename, "->", compiled_filename)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main([arg for arg in args if arg != "--graph"], "--graph" in args)
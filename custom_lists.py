@@ -0,0 +1,172 @@
+"""Word lists that servers upload as text files with one word per line
+
+Uploaded lists are saved as wordLists/custom/<guild ID>/<name>.txt,
+so they are found again after a restart"""
+
+import os
+import re
+import tempfile
+import threading
+
+import aiohttp
+
+import config
+import word_lists
+
+CUSTOM_LIST_DIR = "custom/"
+
+# Maximum size of an uploaded word list file in bytes
+CUSTOM_LIST_MAX_BYTES = 5_000_000
+
+# Maximum number of custom word lists per server
+MAX_CUSTOM_LISTS = 10
+
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadException(Exception):
+    """Exception when an uploaded word list can't be used"""
+
+
+def get_entry(guild_id, name):
+    """Returns the word list entry of a custom list, like the ones in wordle.WORD_LISTS"""
+    return {
+        "name": name,
+        "filename": f"{CUSTOM_LIST_DIR}{guild_id}/{name}.txt",
+        "description": "Custom word list of this server",
+        "language": None,
+    }
+
+
+def get_lists(guild_id):
+    """Returns the custom word list entries of a server by name"""
+    return lists.get(guild_id, {})
+
+
+def find_name(guild_id, name):
+    """Returns the name of a server's custom list with a name in any case, or None"""
+    return next(
+        (other for other in get_lists(guild_id) if other.lower() == name.lower()), None
+    )
+
+
+def scan():
+    """Finds the saved custom lists of all servers"""
+    global lists
+    directory = word_lists.WORD_LIST_DIR + CUSTOM_LIST_DIR
+    found = {}
+    if os.path.isdir(directory):
+        for guild_id in filter(str.isdigit, os.listdir(directory)):
+            for filename in os.listdir(directory + guild_id):
+                name, extension = os.path.splitext(filename)
+                if extension == ".txt" and NAME_PATTERN.fullmatch(name):
+                    found.setdefault(int(guild_id), {})[name] = get_entry(
+                        int(guild_id), name
+                    )
+    with _lock:
+        lists = found
+
+
+def check_upload(guild_id, name, size, reserved_names):
+    """Checks a list before it's downloaded, raises an exception if it can't be added"""
+    if not NAME_PATTERN.fullmatch(name):
+        raise UploadException(
+            "Word list names can only have letters, digits, - and _ (up to 32)!"
+        )
+    if name.lower() in map(str.lower, reserved_names):
+        raise UploadException(f"There already is a word list called {name}!")
+    if (
+        find_name(guild_id, name) is None
+        and len(get_lists(guild_id)) >= MAX_CUSTOM_LISTS
+    ):
+        raise UploadException(
+            f"This server already has {MAX_CUSTOM_LISTS} word lists! Replace one by uploading a list with the same name."
+        )
+    if size > CUSTOM_LIST_MAX_BYTES:
+        raise UploadException(
+            f"Word lists can't be bigger than {CUSTOM_LIST_MAX_BYTES // 1000} KB!"
+        )
+
+
+async def download(attachment, guild_id):
+    """Saves an attachment to a temporary file, a chunk at a time so the file
+    is never in memory as a whole. Returns the file name"""
+    directory = f"{word_lists.WORD_LIST_DIR}{CUSTOM_LIST_DIR}{guild_id}"
+    os.makedirs(directory, exist_ok=True)
+    file = tempfile.NamedTemporaryFile("wb", dir=directory, suffix=".tmp", delete=False)
+    try:
+        with file:
+            size = 0
+            async with aiohttp.ClientSession() as session:
+                async with session.get(attachment.url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(
+                        DOWNLOAD_CHUNK_SIZE
+                    ):
+                        size += len(chunk)
+                        if size > CUSTOM_LIST_MAX_BYTES:
+                            raise UploadException(
+                                f"Word lists can't be bigger than {CUSTOM_LIST_MAX_BYTES // 1000} KB!"
+                            )
+                        file.write(chunk)
+    except aiohttp.ClientError as ex:
+        os.remove(file.name)
+        raise UploadException("The file couldn't be downloaded!") from ex
+    except BaseException:
+        os.remove(file.name)
+        raise
+    return file.name
+
+
+def add(guild_id, name, temporary_filename):
+    """Reads, deduplicates and indexes a downloaded list, then saves it and swaps it in.
+    A list with the same name in any case is replaced, games that use it keep
+    the old words.
+    Blocks while reading, so it should run in a worker. Returns the loaded list"""
+    entry = get_entry(guild_id, name)
+    filename = word_lists.WORD_LIST_DIR + entry["filename"]
+    old_name = find_name(guild_id, name)
+    try:
+        try:
+            loaded = word_lists.WordList.from_file(name, temporary_filename)
+        except UnicodeDecodeError as ex:
+            raise UploadException("Word lists need to be UTF-8 text files!") from ex
+        if not len(loaded):
+            raise UploadException("The file doesn't contain any words!")
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        os.remove(temporary_filename)
+        raise
+    if old_name not in (None, name):
+        # Renamed by case, on case-insensitive file systems it's the same file
+        old_filename = (
+            word_lists.WORD_LIST_DIR + get_entry(guild_id, old_name)["filename"]
+        )
+        if os.path.exists(old_filename) and not os.path.samefile(
+            old_filename, filename
+        ):
+            os.remove(old_filename)
+    word_lists.cache.put(entry, loaded)
+    global lists
+    with _lock:
+        guild_lists = {
+            other: other_entry
+            for other, other_entry in lists.get(guild_id, {}).items()
+            if other != old_name
+        }
+        lists = {**lists, guild_id: {**guild_lists, name: entry}}
+    return loaded
+
+
+# Load optional settings from config
+if hasattr(config, "CUSTOM_LIST_MAX_BYTES"):
+    CUSTOM_LIST_MAX_BYTES = config.CUSTOM_LIST_MAX_BYTES
+if hasattr(config, "MAX_CUSTOM_LISTS"):
+    MAX_CUSTOM_LISTS = config.MAX_CUSTOM_LISTS
+
+_lock = threading.Lock()
+# Custom word list entries by guild ID and name, replaced as a whole when it changes
+lists = {}
+scan()
@@ -0,0 +1,87 @@
+"""Daily words that are the same for every channel with the same settings"""
+
+import array
+import datetime
+import random
+import threading
+import weakref
+
+import config
+
+# Changing the seed changes the order of all daily words
+DAILY_SEED = "wortlerino"
+
+# Day number 0, days start at midnight UTC
+DAILY_EPOCH = datetime.date(2022, 1, 1)
+
+
+class Schedule:
+    """A fixed random order of the eligible words of a word list for some settings,
+    each word is used once before the order repeats. Buckets are sorted in every word
+    list format, so the order only depends on which words the list has"""
+
+    def __init__(self, buckets, lengths, seed):
+        self.seed = seed
+        self.buckets = [buckets[length] for length in lengths if length in buckets]
+        total = sum(map(len, self.buckets))
+        self.order = array.array("I", range(total))
+        random.Random(seed).shuffle(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def word(self, day):
+        """Returns the word of a day"""
+        index = self.order[day % len(self.order)]
+        for bucket in self.buckets:
+            if index < len(bucket):
+                return bucket[index]
+            index -= len(bucket)
+        raise IndexError(day)
+
+    def words(self, day, count):
+        """Returns the word of a day and more random words of the same length,
+        or None if there aren't enough words of that length"""
+        first = self.word(day)
+        bucket = next(bucket for bucket in self.buckets if len(bucket[0]) == len(first))
+        if len(bucket) < count:
+            return None
+        rng = random.Random(f"{self.seed}/{day}/{count}")
+        words = [first]
+        while len(words) < count:
+            word = bucket[rng.randrange(len(bucket))]
+            if word not in words:
+                words.append(word)
+        return words
+
+
+def today():
+    """Returns the number of the current day"""
+    return (datetime.datetime.now(datetime.timezone.utc).date() - DAILY_EPOCH).days
+
+
+def get_schedule(word_list, letters, min_length, max_length):
+    """Returns the schedule for a loaded word list, alphabet and length range,
+    computing it on first use. Returns None if there are no words to choose"""
+    key = (letters, min_length, max_length)
+    with _lock:
+        schedules = _schedules.setdefault(word_list, {})
+        if key not in schedules:
+            schedule = Schedule(
+                word_list.get_buckets(letters),
+                range(min_length, max_length + 1),
+                f"{DAILY_SEED}/{word_list.name}/{letters}/{min_length}-{max_length}",
+            )
+            schedules[key] = schedule if len(schedule) else None
+        return schedules[key]
+
+
+# Load optional settings from config
+if hasattr(config, "DAILY_SEED"):
+    DAILY_SEED = config.DAILY_SEED
+if hasattr(config, "DAILY_EPOCH"):
+    DAILY_EPOCH = config.DAILY_EPOCH
+
+_lock = threading.Lock()
+# Schedules by loaded word list (so reloaded lists get new schedules) and settings
+_schedules = weakref.WeakKeyDictionary()
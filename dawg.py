@@ -0,0 +1,437 @@
+"""Word lists as directed acyclic word graphs (tries with shared suffixes),
+for membership, pattern searches and random words of a length
+
+A graph trades time for memory: the English list takes about 4.5 MB as graph
+instead of about 43 MB as text, but building its graph takes about 40 seconds.
+
+Words of each length get their own root, so every node only leads to words of one
+length and can keep a single word count, which is used to pick and number words.
+The graph is stored as flat arrays, and saved to disk in the same layout to be
+memory-mapped:
+    header: magic, byte order marker, node count, edge count, root count, letter count
+    root table: word length, root node
+    letters: uint32 code points of all letters in the graph, sorted
+    per node: uint32 index of its first edge (node count + 1 entries)
+    per node: uint32 word count
+    per edge (sorted by letter for each node): uint32 target node
+    per edge: uint8 index of its letter"""
+
+import array
+import bisect
+import collections
+import mmap
+import struct
+
+import numpy as np
+
+from wordle_guess import Guess
+
+MAGIC = b"DAWG"
+BYTE_ORDER = 0x01020304
+HEADER = struct.Struct("=4sIIIII")
+ROOT = struct.Struct("=II")
+
+
+class Dawg:
+    """A directed acyclic word graph, built from words or loaded from a file"""
+
+    def __init__(
+        self, roots, alphabet, first_edges, counts, targets, labels, buffer=None
+    ):
+        self.roots = roots  # Root node by word length
+        self.alphabet = alphabet
+        self.letter_indexes = {letter: i for i, letter in enumerate(alphabet)}
+        self.first_edges = first_edges
+        self.counts = counts
+        self.labels = labels
+        self.targets = targets
+        self.buffer = buffer
+
+    @classmethod
+    def from_words(cls, words):
+        """Builds the graph of some words"""
+        by_length = collections.defaultdict(set)
+        for word in words:
+            by_length[len(word)].add(word)
+        builder = _Builder()
+        roots = {
+            length: builder.add_words(sorted(by_length[length]))
+            for length in sorted(by_length)
+            if length
+        }
+        return cls(*builder.compact(roots))
+
+    @classmethod
+    def load(cls, filename):
+        """Memory-maps a graph saved with save().
+        Raises OSError if the file isn't a graph saved on this kind of machine"""
+        with open(filename, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            byte_order,
+            node_count,
+            edge_count,
+            root_count,
+            letter_count,
+        ) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or byte_order != BYTE_ORDER:
+            raise OSError(f"{filename} is not a word graph for this machine")
+        roots = dict(
+            ROOT.unpack_from(buffer, HEADER.size + i * ROOT.size)
+            for i in range(root_count)
+        )
+        position = HEADER.size + root_count * ROOT.size
+        arrays = []
+        for count, typecode in (
+            (letter_count, "I"),
+            (node_count + 1, "I"),
+            (node_count, "I"),
+            (edge_count, "I"),
+            (edge_count, "B"),
+        ):
+            size = count * struct.calcsize(typecode)
+            arrays.append(memoryview(buffer)[position : position + size].cast(typecode))
+            position += size
+        alphabet = "".join(map(chr, arrays[0]))
+        return cls(roots, alphabet, *arrays[1:], buffer=buffer)
+
+    def save(self, filename):
+        """Writes the graph to a file"""
+        with open(filename, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC,
+                    BYTE_ORDER,
+                    len(self.counts),
+                    len(self.labels),
+                    len(self.roots),
+                    len(self.alphabet),
+                )
+            )
+            for length, root in sorted(self.roots.items()):
+                file.write(ROOT.pack(length, root))
+            file.write(array.array("I", map(ord, self.alphabet)).tobytes())
+            for values in (self.first_edges, self.counts, self.targets):
+                file.write(array.array("I", values).tobytes())
+            file.write(array.array("B", self.labels).tobytes())
+
+    def __contains__(self, word):
+        node = self.roots.get(len(word))
+        for letter in word:
+            if node is None:
+                return False
+            node = self._child(node, letter)
+        return node is not None
+
+    def __len__(self):
+        return sum(self.counts[root] for root in self.roots.values())
+
+    def count(self, length):
+        """Number of words of a length"""
+        root = self.roots.get(length)
+        return 0 if root is None else self.counts[root]
+
+    def word(self, length, index):
+        """Returns the word at an index of the sorted words of a length"""
+        node = self.roots[length]
+        letters = []
+        for _ in range(length):
+            for edge in range(self.first_edges[node], self.first_edges[node + 1]):
+                target = self.targets[edge]
+                if index < self.counts[target]:
+                    letters.append(self.alphabet[self.labels[edge]])
+                    node = target
+                    break
+                index -= self.counts[target]
+        return "".join(letters)
+
+    def sample(self, length, rng):
+        """Returns a random word of a length, or None if there is none"""
+        count = self.count(length)
+        return self.word(length, rng.randrange(count)) if count else None
+
+    def words(self, length, letters=None):
+        """Yields the index and word of the sorted words of a length,
+        only those made of the given letters if letters are given"""
+        root = self.roots.get(length)
+        if root is None:
+            return
+        # Stack of (node, index of its first word, word so far)
+        stack = [(root, 0, "")]
+        while stack:
+            node, index, prefix = stack.pop()
+            if len(prefix) == length:
+                yield index, prefix
+                continue
+            children = []
+            for edge in range(self.first_edges[node], self.first_edges[node + 1]):
+                target = self.targets[edge]
+                letter = self.alphabet[self.labels[edge]]
+                if letters is None or letter in letters:
+                    children.append((target, index, prefix + letter))
+                index += self.counts[target]
+            stack.extend(reversed(children))
+
+    def word_masks(self, length, letter_mask):
+        """Returns the bitwise OR of letter_mask(letter) over the letters of each word
+        of a length, in word order, as an array of uint64. Walks the graph one level
+        at a time with NumPy instead of building the words"""
+        root = self.roots.get(length)
+        if root is None:
+            return np.zeros(0, dtype=np.uint64)
+        first_edges = np.asarray(self.first_edges)
+        targets = np.asarray(self.targets)
+        labels = np.asarray(self.labels)
+        bits = np.array(list(map(letter_mask, self.alphabet)), dtype=np.uint64)
+        # Every prefix of the current length with its node, in word order
+        nodes = np.array([root])
+        masks = np.zeros(1, dtype=np.uint64)
+        for _ in range(length):
+            starts = first_edges[nodes].astype(np.int64)
+            counts = first_edges[nodes + 1] - starts
+            # The edges of each node one after another, sorted by letter
+            edges = np.arange(counts.sum()) + np.repeat(
+                starts - np.cumsum(counts) + counts, counts
+            )
+            masks = np.repeat(masks, counts) | bits[labels[edges]]
+            nodes = targets[edges]
+        return masks
+
+    def search(self, constraints):
+        """Returns the words that fit the constraints, in order"""
+        root = self.roots.get(constraints.length)
+        if root is None:
+            return []
+        results = []
+        self._search(root, "", collections.Counter(), constraints, results)
+        return results
+
+    def _search(self, node, prefix, counts, constraints, results):
+        position = len(prefix)
+        if position == constraints.length:
+            results.append(prefix)
+            return
+        fixed = constraints.fixed[position]
+        if fixed is not None:
+            edges = [self._edge(node, fixed)]
+        else:
+            edges = range(self.first_edges[node], self.first_edges[node + 1])
+        remaining = constraints.length - position - 1
+        for edge in edges:
+            if edge is None:
+                continue
+            letter = self.alphabet[self.labels[edge]]
+            if not constraints.allows(position, letter, counts[letter] + 1):
+                continue
+            counts[letter] += 1
+            # Skip if the letters that must still appear don't fit in the rest
+            missing = sum(
+                max(0, count - counts[required])
+                for required, count in constraints.min_counts.items()
+            )
+            if missing <= remaining:
+                self._search(
+                    self.targets[edge], prefix + letter, counts, constraints, results
+                )
+            counts[letter] -= 1
+
+    def _edge(self, node, letter):
+        """Returns the edge of a node for a letter, or None"""
+        code = self.letter_indexes.get(letter)
+        if code is None:
+            return None
+        start, end = self.first_edges[node], self.first_edges[node + 1]
+        edge = bisect.bisect_left(self.labels, code, start, end)
+        if edge < end and self.labels[edge] == code:
+            return edge
+        return None
+
+    def _child(self, node, letter):
+        edge = self._edge(node, letter)
+        return None if edge is None else self.targets[edge]
+
+
+class Constraints:
+    """What is known about a word of some length: letters at positions,
+    letters not at positions, and how often letters appear at least and at most"""
+
+    __slots__ = ("length", "letters", "fixed", "excluded", "min_counts", "max_counts")
+
+    def __init__(self, length, letters=None):
+        self.length = length
+        self.letters = letters  # Allowed letters, None for all
+        self.fixed = [None] * length
+        self.excluded = [set() for _ in range(length)]
+        self.min_counts = {}
+        self.max_counts = {}
+
+    @classmethod
+    def from_pattern(cls, pattern, excluded_letters="", wildcard="_"):
+        """Constraints of a pattern like "c_a_e" without some letters"""
+        constraints = cls(len(pattern))
+        for position, letter in enumerate(pattern):
+            if letter != wildcard:
+                constraints.fixed[position] = letter
+        for letter in excluded_letters:
+            constraints.max_counts[letter] = 0
+        return constraints
+
+    @classmethod
+    def from_guesses(cls, guesses, length, letters=None):
+        """Constraints learned from rows of LetterGuess: green letters are fixed,
+        yellow and grey ones are excluded at their position, and each guess shows
+        how often a letter appears at least, or exactly if one of its copies is grey
+        """
+        constraints = cls(length, letters)
+        for attempt in guesses:
+            found = collections.Counter(
+                guess.letter for guess in attempt if guess.guess != Guess.INCORRECT
+            )
+            for position, guess in enumerate(attempt):
+                if guess.guess == Guess.CORRECT:
+                    constraints.fixed[position] = guess.letter
+                    continue
+                constraints.excluded[position].add(guess.letter)
+                if guess.guess == Guess.INCORRECT:
+                    constraints.max_counts[guess.letter] = min(
+                        constraints.max_counts.get(guess.letter, length),
+                        found[guess.letter],
+                    )
+            for letter, count in found.items():
+                constraints.min_counts[letter] = max(
+                    constraints.min_counts.get(letter, 0), count
+                )
+        return constraints
+
+    @classmethod
+    def from_game(cls, game):
+        """Constraints learned from the guesses of a WordleGame"""
+        return cls.from_guesses(game.guesses, len(game.word), game.valid_letters)
+
+    def allows(self, position, letter, count):
+        """Checks if a letter can be at a position as its count-th copy so far"""
+        return (
+            (self.letters is None or letter in self.letters)
+            and letter not in self.excluded[position]
+            and count <= self.max_counts.get(letter, self.length)
+        )
+
+
+class _Builder:
+    """Builds the graph from sorted words, merging equal suffixes as it goes
+    (incremental construction by Daciuk et al.)"""
+
+    def __init__(self):
+        self.nodes = []  # Children as {letter: node}, None for merged nodes
+        self.register = {}  # Children of a finished node -> node
+
+    def add_words(self, words):
+        """Adds sorted words of one length, returns their root node"""
+        root = self._new_node()
+        unchecked = []  # (parent, letter, child) along the last word
+        previous = ""
+        for word in words:
+            common = 0
+            while common < len(previous) and word[common] == previous[common]:
+                common += 1
+            self._minimize(unchecked, common)
+            node = unchecked[-1][2] if unchecked else root
+            for letter in word[common:]:
+                child = self._new_node()
+                self.nodes[node][letter] = child
+                unchecked.append((node, letter, child))
+                node = child
+            previous = word
+        self._minimize(unchecked, 0)
+        return root
+
+    def _new_node(self):
+        self.nodes.append({})
+        return len(self.nodes) - 1
+
+    def _minimize(self, unchecked, down_to):
+        """Replaces the unchecked nodes below a depth with equal registered ones"""
+        while len(unchecked) > down_to:
+            parent, letter, child = unchecked.pop()
+            key = tuple(sorted(self.nodes[child].items()))
+            existing = self.register.get(key)
+            if existing is None:
+                self.register[key] = child
+            else:
+                self.nodes[parent][letter] = existing
+                self.nodes[child] = None
+
+    def compact(self, roots):
+        """Returns roots, alphabet, first edges, counts, targets and labels as arrays,
+        with the nodes renumbered in order of a depth-first walk.
+        Raises ValueError if the words have more than 256 different letters"""
+        numbers = {}
+        order = []
+        stack = list(reversed(roots.values()))
+        while stack:
+            node = stack.pop()
+            if node in numbers:
+                continue
+            numbers[node] = len(order)
+            order.append(node)
+            stack.extend(
+                child for _, child in sorted(self.nodes[node].items(), reverse=True)
+            )
+
+        alphabet = "".join(
+            sorted({letter for node in order for letter in self.nodes[node]})
+        )
+        if len(alphabet) > 256:
+            raise ValueError("Word graphs can have at most 256 different letters")
+        letter_indexes = {letter: i for i, letter in enumerate(alphabet)}
+        first_edges = array.array("I", [0])
+        labels = array.array("B")
+        targets = array.array("I")
+        for node in order:
+            for letter, child in sorted(self.nodes[node].items()):
+                labels.append(letter_indexes[letter])
+                targets.append(numbers[child])
+            first_edges.append(len(labels))
+
+        # Words below each node, children are counted before their parents
+        counts = array.array("I", [0] * len(order))
+        for number in _children_first(first_edges, targets, len(order)):
+            start, end = first_edges[number], first_edges[number + 1]
+            if start == end:
+                counts[number] = 1  # End of a word
+            else:
+                counts[number] = sum(
+                    counts[targets[edge]] for edge in range(start, end)
+                )
+        return (
+            {length: numbers[root] for length, root in roots.items()},
+            alphabet,
+            first_edges,
+            counts,
+            targets,
+            labels,
+        )
+
+
+def _children_first(first_edges, targets, node_count):
+    """Returns all nodes ordered so that each node comes after its children"""
+    visited = bytearray(node_count)
+    order = []
+    for start in range(node_count):
+        if visited[start]:
+            continue
+        stack = [(start, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                order.append(node)
+                continue
+            if visited[node]:
+                continue
+            visited[node] = 1
+            stack.append((node, True))
+            for edge in range(first_edges[node], first_edges[node + 1]):
+                if not visited[targets[edge]]:
+                    stack.append((targets[edge], False))
+    return order
@@ -0,0 +1,366 @@
+"""Statistics of won games by channel and by player, with a leaderboard per channel
+
+Every won game is appended as a small event to an event log. The statistics are
+running totals (a histogram of the number of guesses, streaks, the leaderboard)
+that each event updates as it comes in, so showing them takes the same time no
+matter how many games were played. New events and changed totals are written in
+batches, events older than STATS_EVENT_RETENTION days are removed from the log from
+time to time (the totals keep counting them)."""
+
+import asyncio
+import heapq
+import json
+import sqlite3
+import threading
+import time
+
+import config
+import daily
+import state_store
+import wordle
+
+# SQLite database file for statistics (None to keep them in memory only),
+# the same file as the wordle states by default
+STATS_DATABASE = state_store.STATE_DATABASE
+
+# Seconds between writing new events and changed totals to the database
+STATS_FLUSH_INTERVAL = 5
+
+# Seconds after which totals that weren't used are removed from memory
+# (they're loaded again when needed, None to keep all totals)
+STATS_IDLE_TIMEOUT = 3600
+
+# Days after which events are removed from the event log (None to keep all)
+STATS_EVENT_RETENTION = 30
+
+# Seconds between removing old events
+STATS_COMPACT_INTERVAL = 3600
+
+# Number of players on a channel's leaderboard
+LEADERBOARD_SIZE = 10
+
+# Games won with more guesses than this are counted in the last histogram bar
+HISTOGRAM_SIZE = 10
+
+
+class Totals:
+    """Running totals of the games won in a channel or by a player"""
+
+    def __init__(self):
+        self.games = 0
+        self.guesses = 0
+        self.histogram = [0] * HISTOGRAM_SIZE  # Games by number of guesses
+        self.last_day = None  # Last day with a won game
+        self.streak = 0  # Days in a row with a won game, up to last_day
+        self.best_streak = 0
+        self.wins = {}  # Games won by player ID
+        self.top = []  # Heap of (games won, player ID) of the best players
+
+    def add(self, day, guesses, user_id=None):
+        """Counts a won game, and a win of a player on the leaderboard if user_id is given"""
+        self.games += 1
+        self.guesses += guesses
+        self.histogram[min(guesses, HISTOGRAM_SIZE) - 1] += 1
+        if self.last_day is None or day > self.last_day + 1:
+            self.streak = 1
+        elif day == self.last_day + 1:
+            self.streak += 1
+        self.last_day = max(day, self.last_day or day)
+        self.best_streak = max(self.best_streak, self.streak)
+        if user_id is not None:
+            self.wins[user_id] = self.wins.get(user_id, 0) + 1
+            self._update_top(user_id, self.wins[user_id])
+
+    def _update_top(self, user_id, wins):
+        """Keeps the best players in the heap. Wins only go up, so a player that
+        isn't in it can only get in by passing the worst one in it"""
+        for i, (_, top_user_id) in enumerate(self.top):
+            if top_user_id == user_id:
+                self.top[i] = (wins, user_id)
+                heapq.heapify(self.top)
+                return
+        if len(self.top) < LEADERBOARD_SIZE:
+            heapq.heappush(self.top, (wins, user_id))
+        elif wins > self.top[0][0]:
+            heapq.heapreplace(self.top, (wins, user_id))
+
+    def current_streak(self):
+        """Returns the streak, or 0 if there was no won game today or yesterday"""
+        if self.last_day is None or daily.today() > self.last_day + 1:
+            return 0
+        return self.streak
+
+    def leaderboard(self):
+        """Returns (player ID, games won) of the best players, best first"""
+        return [(user_id, wins) for wins, user_id in sorted(self.top, reverse=True)]
+
+    def to_dict(self):
+        return {
+            "n": self.games,
+            "g": self.guesses,
+            "h": self.histogram,
+            "d": self.last_day,
+            "s": self.streak,
+            "b": self.best_streak,
+            "w": [[user_id, wins] for user_id, wins in self.wins.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        totals = cls()
+        totals.games = data["n"]
+        totals.guesses = data["g"]
+        totals.histogram = data["h"]
+        totals.last_day = data["d"]
+        totals.streak = data["s"]
+        totals.best_streak = data["b"]
+        totals.wins = dict(map(tuple, data["w"]))
+        totals.top = heapq.nlargest(
+            LEADERBOARD_SIZE, ((wins, user_id) for user_id, wins in totals.wins.items())
+        )
+        heapq.heapify(totals.top)
+        return totals
+
+
+class StatsStore:
+    """Stores events and serialized totals by key, without persisting them"""
+
+    def __init__(self):
+        self.events = []
+        self.totals = {}
+
+    def load(self, key):
+        """Returns the stored totals data of a key, or None"""
+        return self.totals.get(key)
+
+    def save_many(self, events, totals):
+        """Appends events and stores the totals data of many keys at once"""
+        self.events += events
+        self.totals.update(totals)
+
+    def compact(self, before):
+        """Removes the events of days before a day, returns how many were removed"""
+        count = len(self.events)
+        self.events = [event for event in self.events if event[0] >= before]
+        return count - len(self.events)
+
+    def close(self):
+        """Releases the store's resources"""
+
+
+class SQLiteStatsStore(StatsStore):
+    """Stores events and serialized totals in a SQLite database.
+    Events and the totals they changed are written in one transaction"""
+
+    def __init__(self, filename):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS game_events ("
+                "day INTEGER NOT NULL, guild_id INTEGER, channel_id INTEGER NOT NULL, "
+                "user_id INTEGER, guesses INTEGER NOT NULL, boards INTEGER NOT NULL, "
+                "length INTEGER NOT NULL, daily INTEGER NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS game_events_day ON game_events (day)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS game_totals ("
+                "key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+
+    def load(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM game_totals WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, events, totals):
+        rows = [
+            (key, json.dumps(data, separators=(",", ":")))
+            for key, data in totals.items()
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO game_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", events
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO game_totals (key, data) VALUES (?, ?)", rows
+            )
+
+    def compact(self, before):
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "DELETE FROM game_events WHERE day < ?", (before,)
+            ).rowcount
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def channel_key(channel_id):
+    return f"channel:{channel_id}"
+
+
+def player_key(guild_id, user_id):
+    """Players are counted per server, so each shard only changes its own totals"""
+    return f"player:{guild_id or 0}:{user_id}"
+
+
+class GameStats:
+    """Totals of recently active channels and players, backed by a stats store.
+    Events and changed totals are written in batches by flush()"""
+
+    def __init__(self, store, idle_timeout=None):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.totals = {}
+        self.last_used = {}
+        self.events = []  # Events that haven't been written yet
+        self.dirty = set()  # Keys of totals that changed since the last flush
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_task = None
+
+    def get(self, key):
+        """Returns the totals of a key, loading or creating them if necessary"""
+        with self.lock:
+            self.last_used[key] = time.monotonic()
+            if key in self.totals:
+                return self.totals[key]
+        data = self.store.load(key)
+        totals = Totals.from_dict(data) if data else Totals()
+        with self.lock:
+            return self.totals.setdefault(key, totals)
+
+    def record(self, guild_id, channel_id, user_id, game, daily_game):
+        """Counts a game that was just won (user_id made the last guess, or is None).
+        Loads the totals it changes if necessary, so it should run in a worker"""
+        day = daily.today()
+        guesses = len(
+            game.guessed_words
+            if isinstance(game, wordle.MultiWordleGame)
+            else game.guesses
+        )
+        event = (
+            day,
+            guild_id,
+            channel_id,
+            user_id,
+            guesses,
+            len(game.words),
+            len(game.words[0]),
+            int(daily_game),
+        )
+        channel_totals = self.get(channel_key(channel_id))
+        player_totals = (
+            self.get(player_key(guild_id, user_id)) if user_id is not None else None
+        )
+        with self.lock:
+            channel_totals.add(day, guesses, user_id)
+            self.dirty.add(channel_key(channel_id))
+            if player_totals is not None:
+                player_totals.add(day, guesses)
+                self.dirty.add(player_key(guild_id, user_id))
+            self.events.append(event)
+
+    def summary(self, key):
+        """Returns what the stats command shows of the totals of a key"""
+        totals = self.get(key)
+        with self.lock:
+            return {
+                "games": totals.games,
+                "guesses": totals.guesses,
+                "histogram": list(totals.histogram),
+                "streak": totals.current_streak(),
+                "best_streak": totals.best_streak,
+                "leaderboard": totals.leaderboard(),
+            }
+
+    def flush(self):
+        """Writes new events and changed totals to the store"""
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+                totals = {
+                    key: self.totals[key].to_dict()
+                    for key in self.dirty
+                    if key in self.totals
+                }
+                self.dirty = set()
+            if events or totals:
+                self.store.save_many(events, totals)
+
+    def evict_idle(self):
+        """Removes totals that haven't been used for a while and are saved from memory"""
+        if self.idle_timeout is None:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        with self.flush_lock, self.lock:
+            for key, last_used in list(self.last_used.items()):
+                if last_used < deadline and key not in self.dirty:
+                    del self.last_used[key]
+                    self.totals.pop(key, None)
+
+    def compact(self, retention):
+        """Removes events older than retention days from the store"""
+        removed = self.store.compact(daily.today() - retention)
+        if removed:
+            print(f"game_stats.py: Removed {removed} old events")
+
+    def start_flushing(self, interval, compact_interval=None, retention=None):
+        """Flushes and evicts every interval seconds from now on,
+        and compacts every compact_interval seconds"""
+        if self.flush_task is None:
+            self.flush_task = asyncio.get_running_loop().create_task(
+                self._flush_periodically(interval, compact_interval, retention)
+            )
+
+    async def _flush_periodically(self, interval, compact_interval, retention):
+        loop = asyncio.get_running_loop()
+        last_compacted = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, self.flush)
+            self.evict_idle()
+            if (
+                retention is not None
+                and compact_interval is not None
+                and time.monotonic() - last_compacted >= compact_interval
+            ):
+                last_compacted = time.monotonic()
+                await loop.run_in_executor(None, self.compact, retention)
+
+    def close(self):
+        """Writes remaining events and totals and closes the store"""
+        self.flush()
+        self.store.close()
+
+
+def create_store():
+    """Returns the configured stats store"""
+    if STATS_DATABASE:
+        return SQLiteStatsStore(STATS_DATABASE)
+    return StatsStore()
+
+
+# Load optional settings from config
+if hasattr(config, "STATS_DATABASE"):
+    STATS_DATABASE = config.STATS_DATABASE
+if hasattr(config, "STATS_FLUSH_INTERVAL"):
+    STATS_FLUSH_INTERVAL = config.STATS_FLUSH_INTERVAL
+if hasattr(config, "STATS_IDLE_TIMEOUT"):
+    STATS_IDLE_TIMEOUT = config.STATS_IDLE_TIMEOUT
+if hasattr(config, "STATS_EVENT_RETENTION"):
+    STATS_EVENT_RETENTION = config.STATS_EVENT_RETENTION
+if hasattr(config, "STATS_COMPACT_INTERVAL"):
+    STATS_COMPACT_INTERVAL = config.STATS_COMPACT_INTERVAL
+if hasattr(config, "LEADERBOARD_SIZE"):
+    LEADERBOARD_SIZE = config.LEADERBOARD_SIZE
+
+stats = GameStats(create_store(), STATS_IDLE_TIMEOUT)
@@ -1,16 +1,51 @@
+import collections
+import hashlib
 import io
+import os
+import struct
+import threading
+import zlib
 from enum import Enum
 from typing import List
 from ttf_opensans import opensans
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, features
 
-from wordle_guess import LetterGuess, Guess
+import config
+import metrics
+from wordle_guess import LetterGuess, Guess, PackedGuesses
 
 IMG_FONT = opensans(font_weight=900).imagefont(size=48)
 SQUARE_WIDTH = 64
 SQUARE_HEIGHT = 64
 GAP = 5
 
+# Shades between a square's color and the white letter in the palette (at most 85)
+PALETTE_SHADES = 64
+
+# "png" or "webp"
+IMAGE_FORMAT = "png"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+ZLIB_HEADER = b"\x78\x9c"
+PNG_COMPRESSION_LEVEL = 6
+
+# WebP effort from 0 (fast) to 6 (small)
+WEBP_METHOD = 0
+
+# Boards next to each other in multi-board games, and pixels between them
+MULTI_BOARD_COLUMNS = 2
+BOARD_GAP = 20
+
+# Number and total bytes of board images kept for games with the same guesses,
+# e.g. channels playing the same daily word (0 to keep none, None for no byte limit)
+IMAGE_CACHE_SIZE = 500
+IMAGE_CACHE_BYTES = 16_000_000
+
+# Directory in which board images are also saved, so they're kept across restarts
+# (None to only keep them in memory), and the maximum bytes of images in it
+IMAGE_CACHE_DIR = None
+IMAGE_CACHE_DISK_BYTES = 500_000_000
+
 
 class Color(Enum):
     """Colors for the squares"""
@@ -46,43 +81,474 @@ def get_color(guess: Guess):
     return tuple(bytes.fromhex(color.value))
 
 
-def get_image_from_guesses(guesses: List[List[LetterGuess]]):
-    """Creates image out of list of guesses"""
-    (width, height) = get_dimensions(guesses)
-    out_img = Image.new("RGBA", (width, height))
-    img_draw = ImageDraw.Draw(out_img)
+def get_glyph(letter: str, font=IMG_FONT):
+    """Returns how much each pixel of a square is covered by a letter (0-255), row by row"""
+    key = (letter, font)
+    if key not in _glyphs:
+        glyph = Image.new("L", (SQUARE_WIDTH, SQUARE_HEIGHT))
+        img_draw = ImageDraw.Draw(glyph)
+        text = letter.upper()
+        _, offset, font_width, font_height = font.getbbox(text)
+        img_draw.text(
+            (
+                (SQUARE_WIDTH - font_width) / 2,
+                (SQUARE_HEIGHT - font_height) / 2 - offset + 8,
+            ),
+            text,
+            font=font,
+            fill=255,
+        )
+        data = glyph.tobytes()
+        _glyphs[key] = [
+            data[i : i + SQUARE_WIDTH] for i in range(0, len(data), SQUARE_WIDTH)
+        ]
+    return _glyphs[key]
 
-    for attempt_idx, attempt in enumerate(guesses):
-        for guess_idx, guess in enumerate(attempt):
 
-            x0 = (guess_idx * SQUARE_WIDTH) + (GAP * (guess_idx)) + GAP
-            y0 = (attempt_idx * SQUARE_HEIGHT) + (GAP * (attempt_idx)) + GAP
+def get_tile(letter: str, guess: Guess, font=IMG_FONT):
+    """Returns the palette indexes of the square for a letter, row by row"""
+    key = (letter, guess, font)
+    if key not in _atlas:
+        table = _shade_tables[guess]
+        _atlas[key] = [row.translate(table) for row in get_glyph(letter, font)]
+    return _atlas[key]
 
-            x1 = x0 + SQUARE_WIDTH - 1
-            y1 = y0 + SQUARE_HEIGHT - 1
 
-            roundedness = 0
-            img_draw.rounded_rectangle(
-                [x0, y0, x1, y1], fill=get_color(guess.guess), radius=roundedness
+def _build_palette():
+    """Returns the palette (transparent, then the shades from each square color
+    to a white letter) and a table from coverage to palette index for each guess type
+    """
+    palette = [(0, 0, 0)]
+    tables = {}
+    for guess in Guess:
+        color = get_color(guess)
+        first = len(palette)
+        for shade in range(PALETTE_SHADES):
+            palette.append(
+                tuple(
+                    round(c + (255 - c) * shade / (PALETTE_SHADES - 1)) for c in color
+                )
             )
-            font_width, font_height = img_draw.textsize(
-                guess.letter.upper(), font=IMG_FONT
+        tables[guess] = bytes(
+            first + round(coverage * (PALETTE_SHADES - 1) / 255)
+            for coverage in range(256)
+        )
+    return b"".join(bytes(color) for color in palette), tables
+
+
+# Letter coverage by (letter, font), and squares by (letter, guess, font)
+_glyphs = {}
+_atlas = {}
+
+PALETTE, _shade_tables = _build_palette()
+
+
+class BoardRenderer:
+    """Renders the guesses of one game as palette PNG or WebP, only drawing
+    (and for PNG compressing) the rows that are new since the last render"""
+
+    def __init__(self, image_format=None):
+        self.image_format = image_format or IMAGE_FORMAT
+        self.filename = f"guesses.{self.image_format}"
+        self.reset()
+
+    def reset(self):
+        """Forgets the drawn rows, needed when a new game starts"""
+        self.width = None
+        self.rows = 0
+        self.compressor = None
+        self.compressed = []
+        self.scanlines = []
+
+    def render(self, guesses: List[List[LetterGuess]]):
+        """Creates image out of list of guesses, reusing the previously drawn rows"""
+        width, height = get_dimensions(guesses)
+        if self.width != width or self.rows > len(guesses):
+            self.reset()
+            self.width = width
+            self.compressor = zlib.compressobj(PNG_COMPRESSION_LEVEL)
+            # Transparent gap above the first row
+            self._add_scanlines([bytes(width)] * GAP)
+
+        # Each row is a strip of squares followed by the gap below it
+        gap = bytes(GAP)
+        for attempt in guesses[self.rows :]:
+            tiles = [get_tile(guess.letter, guess.guess) for guess in attempt]
+            self._add_scanlines(
+                [gap + gap.join(rows) + gap for rows in zip(*tiles)]
+                + [bytes(width)] * GAP
             )
-            img_draw.text(
-                (
-                    x0 + (SQUARE_WIDTH - font_width) / 2,
-                    y0
-                    + (SQUARE_HEIGHT - font_height) / 2
-                    - IMG_FONT.getoffset(guess.letter.upper())[1]
-                    + 8,
-                ),
-                guess.letter.upper(),
-                font=IMG_FONT,
-                fill=(255, 255, 255),
+        self.rows = len(guesses)
+
+        buf = io.BytesIO()
+        if self.image_format == "webp":
+            image = Image.frombytes("P", (width, height), b"".join(self.scanlines))
+            image.putpalette(PALETTE)
+            image.info["transparency"] = 0
+            image.convert("RGBA").save(
+                buf, format="WEBP", lossless=True, method=WEBP_METHOD
             )
+        else:
+            # Finish a copy of the compressor, so the next render can continue the stream
+            image_data = b"".join(self.compressed) + self.compressor.copy().flush()
+            _write_png(buf, width, height, image_data)
+        buf.seek(0)
+
+        return buf
+
+    def _add_scanlines(self, scanlines):
+        """Adds rows of palette indexes, compressed as PNG scanlines (without filter)"""
+        if self.image_format == "webp":
+            self.scanlines.extend(scanlines)
+        else:
+            self.compressed.append(
+                self.compressor.compress(
+                    b"".join(b"\x00" + scanline for scanline in scanlines)
+                )
+            )
+
+
+class MultiBoardRenderer:
+    """Renders the boards of a multi-board game next to each other as one palette PNG
+    or WebP. Each row of boards is compressed on its own, so a guess only draws and
+    compresses the new rows of unsolved boards"""
+
+    def __init__(self, image_format=None):
+        self.image_format = image_format or IMAGE_FORMAT
+        self.filename = f"guesses.{self.image_format}"
+        self.reset()
+
+    def reset(self):
+        """Forgets the drawn rows, needed when a new game starts"""
+        self.width = None
+        self.bands = []
+
+    def render(self, boards):
+        """Creates an image out of lists of guesses (one per board),
+        reusing the previously drawn rows"""
+        board_width = get_dimensions(boards[0][:1])[0]
+        columns = min(MULTI_BOARD_COLUMNS, len(boards))
+        width = columns * board_width + (columns - 1) * BOARD_GAP
+        groups = [boards[i : i + columns] for i in range(0, len(boards), columns)]
+        if (
+            self.width != width
+            or len(self.bands) != len(groups)
+            or any(
+                band.rows > max(map(len, group))
+                for band, group in zip(self.bands, groups)
+            )
+        ):
+            self.width = width
+            self.bands = [
+                _Band(self.image_format, width, GAP + (BOARD_GAP if i else 0))
+                for i in range(len(groups))
+            ]
+
+        for band, group in zip(self.bands, groups):
+            rows = max(map(len, group))
+            for row in range(band.rows, rows):
+                band.add(self._draw_row(group, row, columns, board_width))
+            band.rows = rows
+        height = sum(band.height for band in self.bands)
+
+        buf = io.BytesIO()
+        if self.image_format == "webp":
+            scanlines = b"".join(b"".join(band.scanlines) for band in self.bands)
+            image = Image.frombytes("P", (width, height), scanlines)
+            image.putpalette(PALETTE)
+            image.info["transparency"] = 0
+            image.convert("RGBA").save(
+                buf, format="WEBP", lossless=True, method=WEBP_METHOD
+            )
+        else:
+            # The bands are separate parts of one deflate stream, with a zlib header
+            # in front and the checksum of all of them at the end
+            image_data = [ZLIB_HEADER]
+            adler = 1
+            for band in self.bands:
+                image_data.append(band.deflate())
+                adler = _adler32_combine(adler, band.adler, band.length)
+            image_data += [_FINAL_BLOCK, struct.pack(">I", adler)]
+            _write_png(buf, width, height, b"".join(image_data))
+        buf.seek(0)
+
+        return buf
+
+    def _draw_row(self, group, row, columns, board_width):
+        """Returns the scanlines of one row of guesses of a group of boards,
+        blank for boards that were solved before that row"""
+        gap = bytes(GAP)
+        blank = [bytes(board_width)] * SQUARE_HEIGHT
+        parts = []
+        for board in group:
+            if row < len(board):
+                tiles = [get_tile(guess.letter, guess.guess) for guess in board[row]]
+                parts.append([gap + gap.join(rows) + gap for rows in zip(*tiles)])
+            else:
+                parts.append(blank)
+        parts += [blank] * (columns - len(group))
+        board_gap = bytes(BOARD_GAP)
+        return [board_gap.join(lines) for lines in zip(*parts)] + [
+            bytes(self.width)
+        ] * GAP
+
+
+class _Band:
+    """Scanlines of one row of boards, compressed as raw deflate data that ends on
+    a byte boundary (so bands can be put after each other)"""
+
+    def __init__(self, image_format, width, top_lines):
+        self.image_format = image_format
+        self.rows = 0
+        self.height = 0
+        self.compressor = zlib.compressobj(PNG_COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+        self.compressed = []
+        self.adler = 1
+        self.length = 0
+        self.scanlines = []
+        self.add([bytes(width)] * top_lines)
+
+    def add(self, scanlines):
+        """Adds rows of palette indexes"""
+        self.height += len(scanlines)
+        if self.image_format == "webp":
+            self.scanlines.extend(scanlines)
+            return
+        data = b"".join(b"\x00" + scanline for scanline in scanlines)
+        self.adler = zlib.adler32(data, self.adler)
+        self.length += len(data)
+        self.compressed.append(self.compressor.compress(data))
+
+    def deflate(self):
+        """Returns the compressed scanlines so far"""
+        return b"".join(self.compressed) + self.compressor.copy().flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """Returns the Adler-32 checksum of two pieces of data
+    from their checksums and the length of the second (like zlib's adler32_combine)"""
+    base = 65521
+    remainder = length2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % base
+    sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - remainder) % base
+    return sum1 | (sum2 << 16)
+
+
+def _write_png(buf, width, height, image_data):
+    """Writes a palette PNG with already compressed image data"""
+    buf.write(PNG_SIGNATURE)
+    _write_png_chunk(
+        buf, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    )
+    _write_png_chunk(buf, b"PLTE", PALETTE)
+    _write_png_chunk(buf, b"tRNS", b"\x00")
+    _write_png_chunk(buf, b"IDAT", image_data)
+    _write_png_chunk(buf, b"IEND", b"")
+
+
+def _write_png_chunk(buf, chunk_type, data):
+    """Writes a PNG chunk with length and checksum"""
+    buf.write(struct.pack(">I", len(data)))
+    buf.write(chunk_type)
+    buf.write(data)
+    buf.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+class ImageCache:
+    """Least recently used encoded board images by board key (see get_board_key),
+    shared by all games, so boards that look the same are only drawn once.
+    Limited by number of images and their total size in bytes. With a directory,
+    images are also saved there (up to max_disk_bytes, the least recently used are
+    deleted first), so images that were evicted from memory or made before a
+    restart are read back instead of drawn again"""
+
+    def __init__(self, max_images, max_bytes=None, directory=None, max_disk_bytes=None):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.images = collections.OrderedDict()
+        self.size = 0  # Bytes of the images in memory
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        self.disk_size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(size for _, size, _ in self._scan())
+
+    def get(self, key):
+        """Returns the image for a key, or None"""
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+        if image is not None:
+            metrics.image_cache.inc("hit")
+            return image
+        image = self._read(key) if self.directory is not None else None
+        if image is not None:
+            metrics.image_cache.inc("disk_hit")
+            self._put(key, image)
+            return image
+        metrics.image_cache.inc("miss")
+        return None
+
+    def put(self, key, image):
+        """Stores an image, removing the least recently used ones if necessary"""
+        self._put(key, image)
+        if self.directory is not None:
+            self._write(key, image)
+
+    def _put(self, key, image):
+        evicted = 0
+        with self.lock:
+            old = self.images.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.images[key] = image
+            self.size += len(image)
+            while len(self.images) > self.max_images or (
+                self.max_bytes is not None and self.size > self.max_bytes
+            ):
+                _, evicted_image = self.images.popitem(last=False)
+                self.size -= len(evicted_image)
+                evicted += 1
+        if evicted:
+            metrics.image_cache.inc("eviction", evicted)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key.hex())
+
+    def _read(self, key):
+        """Returns a saved image, or None"""
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as file:
+                image = file.read()
+            os.utime(filename)  # Recently used, delete it last
+        except OSError:
+            return None
+        return image
+
+    def _write(self, key, image):
+        """Saves an image, deleting the least recently used ones if the directory is full.
+        Images with the same key are the same, so saved images aren't written again"""
+        filename = self._filename(key)
+        if os.path.exists(filename):
+            return
+        temporary_filename = f"{filename}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_filename, "wb") as file:
+                file.write(image)
+            os.replace(temporary_filename, filename)
+        except OSError as ex:
+            print(f"image_guesses.py: Couldn't save board image: {ex}")
+            return
+        with self.disk_lock:
+            self.disk_size += len(image)
+            if self.max_disk_bytes is None or self.disk_size <= self.max_disk_bytes:
+                return
+            # Delete down to 90% so this doesn't happen with every image
+            files = sorted(self._scan(), key=lambda file: file[2])
+            self.disk_size = sum(size for _, size, _ in files)
+            deleted = 0
+            for filename, size, _ in files:
+                if self.disk_size <= self.max_disk_bytes * 0.9:
+                    break
+                try:
+                    os.remove(filename)
+                except OSError:
+                    continue
+                self.disk_size -= size
+                deleted += 1
+            if deleted:
+                metrics.image_cache.inc("disk_eviction", deleted)
+
+    def _scan(self):
+        """Returns file name, size and last use of all saved images"""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+
+def _hash_boards(image_format, boards: List[PackedGuesses]):
+    """Returns a short hash of the image format, the rendering settings and the
+    letters and results of boards"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image_format}/{_RENDER_SETTINGS}/{len(boards)}".encode())
+    for guesses in boards:
+        words = guesses.words.encode("UTF-8")
+        patterns = guesses.patterns.tobytes()
+        digest.update(struct.pack("=III", guesses.length, len(words), len(patterns)))
+        digest.update(words)
+        digest.update(patterns)
+    return digest.digest()
+
+
+def get_board_key(guesses: PackedGuesses, image_format):
+    """Returns a key that's the same for boards with the same guesses and results"""
+    return _hash_boards(image_format, [guesses])
+
+
+def get_boards_key(boards: List[PackedGuesses], image_format):
+    """Returns a key that's the same for multi-board games with the same boards"""
+    return _hash_boards(image_format, boards)
+
+
+def get_image_from_guesses(guesses: List[List[LetterGuess]]):
+    """Creates image out of list of guesses"""
+    return BoardRenderer().render(guesses)
+
+
+def get_text_from_guesses(guesses: List[List[LetterGuess]], squares):
+    """Writes the guesses as rows of squares (symbols by guess type) and letters,
+    for when there's no time to draw an image"""
+    return "\n".join(
+        "".join(squares[guess.guess] for guess in attempt)
+        + "  "
+        + "".join(guess.letter for guess in attempt).upper()
+        for attempt in guesses
+    )
+
+
+# Load optional settings from config
+if hasattr(config, "IMAGE_FORMAT"):
+    IMAGE_FORMAT = config.IMAGE_FORMAT
+if hasattr(config, "PNG_COMPRESSION_LEVEL"):
+    PNG_COMPRESSION_LEVEL = config.PNG_COMPRESSION_LEVEL
+if hasattr(config, "WEBP_METHOD"):
+    WEBP_METHOD = config.WEBP_METHOD
+if hasattr(config, "IMAGE_CACHE_SIZE"):
+    IMAGE_CACHE_SIZE = config.IMAGE_CACHE_SIZE
+if hasattr(config, "IMAGE_CACHE_BYTES"):
+    IMAGE_CACHE_BYTES = config.IMAGE_CACHE_BYTES
+if hasattr(config, "IMAGE_CACHE_DIR"):
+    IMAGE_CACHE_DIR = config.IMAGE_CACHE_DIR
+if hasattr(config, "IMAGE_CACHE_DISK_BYTES"):
+    IMAGE_CACHE_DISK_BYTES = config.IMAGE_CACHE_DISK_BYTES
 
-    buf = io.BytesIO()
-    out_img.save(buf, format="PNG")
-    buf.seek(0)
+if IMAGE_FORMAT == "webp" and not features.check("webp"):
+    print("image_guesses.py: Pillow was built without WebP support, using PNG")
+    IMAGE_FORMAT = "png"
 
-    return buf
+_FINAL_BLOCK = zlib.compressobj(wbits=-15).flush()
+# Everything that changes how boards look, so saved images of other settings aren't used
+_RENDER_SETTINGS = (
+    f"{SQUARE_WIDTH}x{SQUARE_HEIGHT}/{GAP}/{PALETTE_SHADES}/{PNG_COMPRESSION_LEVEL}/"
+    f"{WEBP_METHOD}/{MULTI_BOARD_COLUMNS}/{BOARD_GAP}/{[color.value for color in Color]}"
+)
+image_cache = ImageCache(
+    IMAGE_CACHE_SIZE, IMAGE_CACHE_BYTES, IMAGE_CACHE_DIR, IMAGE_CACHE_DISK_BYTES
+)
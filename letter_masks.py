@@ -0,0 +1,77 @@
+"""Letters of words as bitmasks with one bit per letter, so checking which letters
+a word has is one AND instead of a loop over its letters
+
+The letters of all alphabets in wordle.LETTERS (and other common Latin letters)
+have their own bit, all other characters share OTHER. Checks involving OTHER
+can't tell those characters apart and have to fall back to comparing letters"""
+
+import functools
+
+import numpy as np
+
+# Letters with their own bit, the first one is bit 0
+MASK_LETTERS = "abcdefghijklmnopqrstuvwxyzßàáâãäåæçèéêëìíîïñòóôõöøùúûüýÿœ"
+LETTER_BITS = {letter: 1 << i for i, letter in enumerate(MASK_LETTERS)}
+OTHER = 1 << 63
+ALL_BITS = (1 << 64) - 1
+
+# Bits of the characters up to the end of Latin Extended-B by code point,
+# to get the masks of many words at once
+_BITS_BY_CODE = np.array(
+    [LETTER_BITS.get(chr(code), OTHER) for code in range(0x250)], dtype=np.uint64
+)
+
+
+def word_mask(word):
+    """Returns the mask of the letters of a word"""
+    mask = 0
+    for letter in word:
+        mask |= LETTER_BITS.get(letter, OTHER)
+    return mask
+
+
+@functools.lru_cache(maxsize=None)
+def alphabet_mask(letters):
+    """Returns the mask of the letters of an alphabet (cached)"""
+    return word_mask(letters)
+
+
+def word_masks(text, length):
+    """Returns the masks of words of the same length that are concatenated in text,
+    as an array of uint64"""
+    codes = np.frombuffer(text.encode("UTF-32-LE"), dtype=np.uint32)
+    bits = np.where(
+        codes < len(_BITS_BY_CODE),
+        _BITS_BY_CODE[np.minimum(codes, len(_BITS_BY_CODE) - 1)],
+        np.uint64(OTHER),
+    )
+    return np.bitwise_or.reduce(bits.reshape(-1, length), axis=1)
+
+
+def fits_alphabet(masks, letters):
+    """Returns which masks only have letters of an alphabet, as a bool array.
+    Only exact for alphabets whose letters all have their own bit"""
+    return masks & np.uint64(~alphabet_mask(letters) & ALL_BITS) == 0
+
+
+def has_only(word, letters):
+    """Checks if a word only has letters of an alphabet"""
+    mask = word_mask(word)
+    alphabet = alphabet_mask(letters)
+    if (mask | alphabet) & OTHER:
+        return set(word).issubset(letters)
+    return not mask & ~alphabet
+
+
+def get_letters(mask):
+    """Returns the letters of a mask (without OTHER), sorted like sorted() sorts them"""
+    letters = []
+    mask &= ~OTHER
+    while mask:
+        bit = mask & -mask
+        letters.append(_LETTERS_BY_BIT[bit])
+        mask ^= bit
+    return "".join(sorted(letters))
+
+
+_LETTERS_BY_BIT = {bit: letter for letter, bit in LETTER_BITS.items()}
@@ -0,0 +1,270 @@
+"""Counters and timings of the message pipeline, served as Prometheus text or logged as JSON"""
+
+import asyncio
+import json
+import threading
+import time
+
+import config
+
+# Set to False to turn off all measuring
+METRICS_ENABLED = True
+
+# Local port for the Prometheus text endpoint (None for no endpoint)
+METRICS_PORT = None
+
+# Seconds between printing all metrics as one JSON line (None to never print them)
+METRICS_LOG_INTERVAL = None
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+class Counter:
+    """Counts events, optionally split up by one label"""
+
+    def __init__(self, name, description, label=None):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, label_value=None, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        """Returns (suffix, label value, value) for each sample"""
+        with self.lock:
+            return [("", label, value) for label, value in self.values.items()]
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+
+class Gauge:
+    """Current value of something, read when the metrics are collected"""
+
+    def __init__(self, name, description, read):
+        self.name = name
+        self.description = description
+        self.label = None
+        self.read = read
+        registry.append(self)
+
+    def samples(self):
+        return [("", None, self.read())]
+
+    def snapshot(self):
+        return self.read()
+
+
+class Histogram:
+    """Distribution of durations in seconds, optionally split up by one label"""
+
+    def __init__(self, name, description, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.values = {}  # label value -> [bucket counts..., count, sum]
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, label_value=None):
+        if not METRICS_ENABLED:
+            return
+        with self.lock:
+            counts = self.values.get(label_value)
+            if counts is None:
+                counts = self.values[label_value] = [0] * (len(self.buckets) + 2)
+            for i, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[i] += 1
+                    break
+            counts[-2] += 1
+            counts[-1] += value
+
+    def time(self, label_value=None):
+        """Context manager observing the time spent inside it"""
+        if not METRICS_ENABLED:
+            return _NO_TIMER
+        return _Timer(self, label_value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for label_value, counts in self.values.items():
+                cumulative = 0
+                for bucket, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append(("_bucket", (label_value, bucket), cumulative))
+                samples.append(("_bucket", (label_value, "+Inf"), counts[-2]))
+                samples.append(("_count", label_value, counts[-2]))
+                samples.append(("_sum", label_value, counts[-1]))
+        return samples
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                label_value: {"count": counts[-2], "sum": counts[-1]}
+                for label_value, counts in self.values.items()
+            }
+
+
+class _Timer:
+    def __init__(self, histogram, label_value):
+        self.histogram = histogram
+        self.label_value = label_value
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.label_value)
+
+
+class _NoTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def span(stage):
+    """Context manager timing a stage of the message pipeline"""
+    return stage_seconds.time(stage)
+
+
+def render_text():
+    """Returns all metrics in the Prometheus text format"""
+    lines = []
+    for metric in registry:
+        kind = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[
+            type(metric)
+        ]
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        for suffix, label_value, value in metric.samples():
+            lines.append(
+                f"{metric.name}{suffix}{_format_labels(metric.label, label_value)} {value}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(label, label_value):
+    labels = []
+    if isinstance(label_value, tuple):
+        label_value, bucket = label_value
+        if label_value is not None:
+            labels.append(f'{label}="{label_value}"')
+        labels.append(f'le="{bucket}"')
+    elif label_value is not None:
+        labels.append(f'{label}="{label_value}"')
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def snapshot():
+    """Returns all metrics as a dict"""
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+async def _handle_request(reader, writer):
+    """Answers any HTTP request with the metrics"""
+    await reader.readline()
+    body = render_text().encode("UTF-8")
+    writer.write(
+        b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+async def _serve(port):
+    """Serves the metrics on a local port, prints why if it can't"""
+    global _server
+    try:
+        _server = await asyncio.start_server(_handle_request, "127.0.0.1", port)
+    except OSError as ex:
+        print(f"metrics.py: Couldn't serve metrics on port {port}: {ex}")
+    else:
+        print(f"metrics.py: Serving metrics on port {port}")
+
+
+async def _log_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        print("metrics.py:", json.dumps(snapshot(), default=str))
+
+
+def start():
+    """Starts the endpoint and periodic logging if configured, only does something once"""
+    global _started
+    if _started or not METRICS_ENABLED:
+        return
+    _started = True
+    loop = asyncio.get_running_loop()
+    if METRICS_PORT:
+        loop.create_task(_serve(METRICS_PORT))
+    if METRICS_LOG_INTERVAL:
+        loop.create_task(_log_periodically(METRICS_LOG_INTERVAL))
+
+
+# Load optional settings from config
+if hasattr(config, "METRICS_ENABLED"):
+    METRICS_ENABLED = config.METRICS_ENABLED
+if hasattr(config, "METRICS_PORT"):
+    METRICS_PORT = config.METRICS_PORT
+if hasattr(config, "METRICS_LOG_INTERVAL"):
+    METRICS_LOG_INTERVAL = config.METRICS_LOG_INTERVAL
+
+_started = False
+_server = None
+registry = []
+
+messages = Counter("wortlerino_messages_total", "Messages handled by the bot")
+games_created = Counter("wortlerino_games_created_total", "Games started")
+guesses = Counter("wortlerino_guesses_total", "Valid guesses made")
+games_won = Counter("wortlerino_games_won_total", "Games won")
+sends_dropped = Counter(
+    "wortlerino_sends_dropped_total", "Boards replaced by newer ones before being sent"
+)
+boards = Counter("wortlerino_boards_total", "Boards sent, by format", "format")
+image_cache = Counter(
+    "wortlerino_image_cache_total",
+    "Board image cache lookups and evictions, by result",
+    "result",
+)
+rejections = Counter(
+    "wortlerino_rejections_total", "Commands rejected, by exception", "exception"
+)
+stage_seconds = Histogram(
+    "wortlerino_stage_seconds",
+    "Time spent in each stage of handling a message",
+    "stage",
+)
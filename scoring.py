@@ -0,0 +1,92 @@
+"""Scores guesses against many words at once, for hints, solvers and stats
+
+Words are encoded as rows of letter indexes, results are packed patterns
+as in wordle_guess.pack_pattern (one base 3 digit per letter)"""
+
+import numpy as np
+
+# Number of guess/answer pairs to score at once in score_matrix
+CHUNK_SIZE = 1_000_000
+
+
+def pattern_dtype(length):
+    """Returns the smallest unsigned int type holding the patterns of words of a length"""
+    if length <= 5:
+        return np.uint8
+    if length <= 10:
+        return np.uint16
+    return np.uint32
+
+
+def encode_words(words, letters):
+    """Encodes words of the same length as an array of letter indexes in an alphabet.
+    Raises ValueError if a word has a different length or letters outside the alphabet
+    """
+    words = list(words)
+    length = len(words[0]) if words else 0
+    indexes = {letter: i for i, letter in enumerate(letters)}
+    encoded = np.empty((len(words), length), dtype=np.uint8)
+    for row, word in enumerate(words):
+        if len(word) != length:
+            raise ValueError(f"{word!r} doesn't have {length} letters")
+        try:
+            encoded[row] = [indexes[letter] for letter in word]
+        except KeyError as ex:
+            raise ValueError(f"{word!r} contains letters outside the alphabet") from ex
+    return encoded
+
+
+def score_matrix(guesses, answers):
+    """Returns the patterns of every encoded guess against every encoded answer,
+    as an array of shape (number of guesses, number of answers)"""
+    length = guesses.shape[1]
+    result = np.empty((len(guesses), len(answers)), dtype=pattern_dtype(length))
+    chunk = max(1, CHUNK_SIZE // max(1, len(answers)))
+    for start in range(0, len(guesses), chunk):
+        result[start : start + chunk] = _score_chunk(
+            guesses[start : start + chunk], answers
+        )
+    return result
+
+
+def score(guess, answers):
+    """Returns the patterns of one encoded guess against every encoded answer"""
+    return score_matrix(guess.reshape(1, -1), answers)[0]
+
+
+def score_words(guess, answers, letters):
+    """Returns the patterns of a guess against a list of answers, as ints"""
+    patterns = score(encode_words([guess], letters)[0], encode_words(answers, letters))
+    return patterns.tolist()
+
+
+def _score_chunk(guesses, answers):
+    """Scores guesses against answers, with the same rules as WordleGame._analyze_guess:
+    green letters first, then each remaining guessed letter from left to right is yellow
+    as long as the answer has unmatched copies of it left"""
+    length = guesses.shape[1]
+    letter_count = int(max(guesses.max(initial=0), answers.max(initial=0))) + 1
+
+    # How often each letter appears in each answer
+    counts = np.zeros((letter_count, len(answers)), dtype=np.uint8)
+    for k in range(length):
+        np.add.at(counts, (answers[:, k], np.arange(len(answers))), 1)
+
+    green = [
+        guesses[:, k, np.newaxis] == answers[np.newaxis, :, k] for k in range(length)
+    ]
+    patterns = np.zeros((len(guesses), len(answers)), dtype=np.uint32)
+    for i in range(length):
+        letter = guesses[:, i]
+        # Copies of the letter in the answer that aren't matched by a green, and
+        # copies of it further left in the guess that took a yellow before this one
+        available = counts[letter]
+        earlier = np.zeros_like(available)
+        for k in range(length):
+            same = (guesses[:, k] == letter)[:, np.newaxis]
+            available = available - (same & green[k])
+            if k < i:
+                earlier += same & ~green[k]
+        yellow = ~green[i] & (earlier < available)
+        patterns += green[i] * np.uint32(2 * 3**i) + yellow * np.uint32(3**i)
+    return patterns
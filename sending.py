@@ -0,0 +1,171 @@
+"""Sends messages in the background, rate limited per channel,
+replacing boards that are outdated before they are sent"""
+
+import asyncio
+import collections
+import contextlib
+import time
+
+import config
+import metrics
+
+# Messages each channel can get per second on average
+SEND_RATE = 1
+
+# Messages a channel can get at once before the rate limit applies
+SEND_BURST = 5
+
+# Maximum number of messages with images being uploaded at the same time
+MAX_UPLOADS = 8
+
+
+class TokenBucket:
+    """Allows capacity actions at once, refilled with rate actions per second"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until the next action is allowed"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Uses up one action"""
+        self._refill()
+        self.tokens -= 1
+
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class _Message:
+    __slots__ = ("channel", "embed", "file", "replaceable", "sent")
+
+    def __init__(self, channel, embed, file, replaceable, sent):
+        self.channel = channel
+        self.embed = embed
+        self.file = file
+        self.replaceable = replaceable
+        self.sent = sent
+
+
+class _ChannelQueue:
+    __slots__ = ("bucket", "messages", "task")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.messages = collections.deque()
+        self.task = None
+
+
+class SendScheduler:
+    """Queues messages per channel and sends them in order in the background"""
+
+    def __init__(self, rate, burst, max_uploads, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_uploads = max_uploads
+        self.clock = clock
+        self.uploads = None
+        self.channels = {}  # Queues of channels with messages to send
+        # Buckets of channels that sent recently and could be rate limited,
+        # by channel ID, in the order their queues became empty
+        self.idle = collections.OrderedDict()
+        self.pending = 0
+        self.dropped = 0
+
+    def send(self, channel, embed, file=None, replaceable=False):
+        """Queues a message and returns a future that is True once it's sent,
+        or False if it was dropped or couldn't be sent.
+        Replaceable messages (boards of running games) are dropped if another
+        message with an image is queued for the channel before they are sent"""
+        if self.uploads is None:
+            self.uploads = asyncio.Semaphore(self.max_uploads)
+        queue = self.channels.get(channel.id)
+        if queue is None:
+            bucket = self.idle.pop(channel.id, None) or TokenBucket(
+                self.rate, self.burst, self.clock
+            )
+            queue = self.channels[channel.id] = _ChannelQueue(bucket)
+        if file is not None:
+            for message in [
+                message for message in queue.messages if message.replaceable
+            ]:
+                queue.messages.remove(message)
+                message.sent.set_result(False)
+                self.pending -= 1
+                self.dropped += 1
+                metrics.sends_dropped.inc()
+        sent = asyncio.get_running_loop().create_future()
+        queue.messages.append(_Message(channel, embed, file, replaceable, sent))
+        self.pending += 1
+        if queue.task is None:
+            queue.task = asyncio.get_running_loop().create_task(
+                self._send_queued(channel.id, queue)
+            )
+        return sent
+
+    async def _send_queued(self, channel_id, queue):
+        """Sends the messages of a channel until its queue is empty"""
+        while queue.messages:
+            delay = queue.bucket.wait_time()
+            if delay:
+                # Newer messages may replace queued ones meanwhile
+                await asyncio.sleep(delay)
+                continue
+            message = queue.messages.popleft()
+            self.pending -= 1
+            queue.bucket.take()
+            uploading = self.uploads if message.file is not None else None
+            try:
+                async with uploading or contextlib.nullcontext():
+                    with metrics.span("send"):
+                        await message.channel.send(
+                            embed=message.embed, file=message.file
+                        )
+            except Exception as ex:  # pylint: disable=broad-except
+                print(f"sending.py: Couldn't send to channel {channel_id}: {ex!r}")
+                message.sent.set_result(False)
+            else:
+                message.sent.set_result(True)
+        queue.task = None
+        del self.channels[channel_id]
+        self._expire_idle()
+        if not queue.bucket.is_full():
+            self.idle[channel_id] = queue.bucket
+
+    def _expire_idle(self):
+        """Forgets the buckets of channels that could send a burst right away again.
+        All buckets fill up at the same speed, so they're checked oldest first"""
+        while self.idle and next(iter(self.idle.values())).is_full():
+            self.idle.popitem(last=False)
+
+    async def drain(self):
+        """Waits until all queued messages are sent"""
+        while True:
+            tasks = [queue.task for queue in self.channels.values() if queue.task]
+            if not tasks:
+                return
+            await asyncio.gather(*tasks)
+
+
+# Load optional settings from config
+if hasattr(config, "SEND_RATE"):
+    SEND_RATE = config.SEND_RATE
+if hasattr(config, "SEND_BURST"):
+    SEND_BURST = config.SEND_BURST
+if hasattr(config, "MAX_UPLOADS"):
+    MAX_UPLOADS = config.MAX_UPLOADS
+
+scheduler = SendScheduler(SEND_RATE, SEND_BURST, MAX_UPLOADS)
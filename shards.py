@@ -0,0 +1,202 @@
+"""Runs the bot as several processes, each connected to discord as one shard
+
+Usage: python shards.py [number of shards]
+       python shards.py --local [number of shards]
+
+Word lists are loaded before the processes are started, so they share them
+(compiled word lists are memory-mapped and always shared). Channel states are
+kept in the state store, which all processes use (see STATE_BACKEND).
+
+The local mode doesn't connect to discord. It reads messages from stdin as
+"guild_id channel_id message", hands each one to the process of its guild's shard
+and prints the responses, so the sharded setup can be tried out offline."""
+
+import asyncio
+import gc
+import multiprocessing
+import multiprocessing.connection
+import runpy
+import sys
+import time
+
+import config
+import image_guesses  # pylint: disable=unused-import
+import metrics
+import warmup
+import word_lists
+import wordle
+
+# Number of shards (and processes) to run
+SHARD_COUNT = 2
+
+# Seconds to wait before restarting a shard that stopped with an error
+SHARD_RESTART_DELAY = 10
+
+
+def shard_for(guild_id, shard_count):
+    """Returns the shard that discord sends a guild's messages to"""
+    return (guild_id >> 22) % shard_count
+
+
+def preload():
+    """Loads all word lists that fit into the cache and draws the letter squares,
+    to be shared by the shard processes"""
+    warmup.warm_glyphs()
+    for word_list in wordle.WORD_LISTS.values():
+        cached = len(word_lists.cache.word_lists)
+        try:
+            word_lists.cache.get(word_list)
+        except OSError as ex:
+            print(f"shards.py: Couldn't load {word_list['name']}: {ex}")
+            continue
+        if len(word_lists.cache.word_lists) <= cached:
+            break  # The cache is full, other lists were unloaded for this one
+    # Keep the garbage collector from touching (and so copying) the shared objects
+    gc.freeze()
+
+
+def set_shard(shard_id, shard_count):
+    """Configures this process as one shard"""
+    config.SHARD_ID = shard_id
+    config.SHARD_COUNT = shard_count
+    # metrics.py already read its settings when it was imported before forking
+    if metrics.METRICS_PORT:
+        metrics.METRICS_PORT += shard_id
+
+
+def run_shard(shard_id, shard_count):
+    """Runs the bot as one shard"""
+    set_shard(shard_id, shard_count)
+    runpy.run_path("wortlerino.py", run_name="__main__")
+
+
+def run_shards(shard_count):
+    """Starts a process for each shard and restarts the ones that fail"""
+    context = multiprocessing.get_context("fork")
+    processes = {}
+
+    def start(shard_id):
+        process = context.Process(
+            target=run_shard, args=(shard_id, shard_count), name=f"shard-{shard_id}"
+        )
+        process.start()
+        processes[process.sentinel] = (shard_id, process)
+
+    for shard_id in range(shard_count):
+        start(shard_id)
+    while processes:
+        for sentinel in multiprocessing.connection.wait(list(processes)):
+            shard_id, process = processes.pop(sentinel)
+            process.join()
+            print(
+                f"shards.py: Shard {shard_id} stopped with exit code {process.exitcode}"
+            )
+            if process.exitcode:
+                time.sleep(SHARD_RESTART_DELAY)
+                start(shard_id)
+
+
+class LocalChannel:
+    """Channel that prints what the bot sends to it"""
+
+    def __init__(self, shard_id, channel_id):
+        self.shard_id = shard_id
+        self.id = channel_id
+
+    async def send(self, embed=None, file=None):
+        attachment = f" [{file.filename}]" if file is not None else ""
+        print(
+            f"[shard {self.shard_id}] #{self.id}: {embed.title} {embed.description}{attachment}",
+            flush=True,
+        )
+
+
+class LocalGuild:
+    """Server of a message read from stdin"""
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class LocalMessage:
+    """Message read from stdin, without an author or attachments"""
+
+    def __init__(self, channel, content, guild):
+        self.channel = channel
+        self.content = content
+        self.guild = guild
+        self.author = None
+        self.attachments = []
+
+
+def run_local_shard(shard_id, shard_count, messages):
+    """Handles the messages of one shard without connecting to discord"""
+    set_shard(shard_id, shard_count)
+    import wortlerino  # pylint: disable=import-outside-toplevel
+
+    async def handle_messages():
+        loop = asyncio.get_running_loop()
+        channels = {}
+        while True:
+            message = await loop.run_in_executor(None, messages.get)
+            if message is None:
+                break
+            guild_id, channel_id, content = message
+            if channel_id not in channels:
+                channels[channel_id] = LocalChannel(shard_id, channel_id)
+            await wortlerino.on_message(
+                LocalMessage(channels[channel_id], content, LocalGuild(guild_id))
+            )
+        await wortlerino.sending.scheduler.drain()
+
+    asyncio.run(handle_messages())
+    wortlerino.wordle_states.close()
+    wortlerino.game_stats.stats.close()
+
+
+def run_local(shard_count, lines):
+    """Routes messages from lines of text to local shard processes by guild"""
+    context = multiprocessing.get_context("fork")
+    queues = [context.Queue() for _ in range(shard_count)]
+    processes = [
+        context.Process(
+            target=run_local_shard,
+            args=(shard_id, shard_count, queues[shard_id]),
+            name=f"shard-{shard_id}",
+        )
+        for shard_id in range(shard_count)
+    ]
+    for process in processes:
+        process.start()
+    for line in lines:
+        try:
+            guild_id, channel_id, content = line.split(maxsplit=2)
+            guild_id, channel_id = int(guild_id), int(channel_id)
+        except ValueError:
+            print("shards.py: Expected guild ID, channel ID and message:", line.strip())
+            continue
+        queues[shard_for(guild_id, shard_count)].put((guild_id, channel_id, content))
+    for queue in queues:
+        queue.put(None)
+    for process in processes:
+        process.join()
+
+
+# Load optional settings from config
+if hasattr(config, "SHARD_COUNT"):
+    SHARD_COUNT = config.SHARD_COUNT
+if hasattr(config, "SHARD_RESTART_DELAY"):
+    SHARD_RESTART_DELAY = config.SHARD_RESTART_DELAY
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    local = "--local" in args
+    if local:
+        args.remove("--local")
+    shard_count = int(args[0]) if args else SHARD_COUNT
+    preload()
+    if local:
+        run_local(shard_count, sys.stdin)
+    else:
+        run_shards(shard_count)
@@ -0,0 +1,277 @@
+"""Hints and remaining candidates for running games, based on precomputed pattern tables"""
+
+import os
+import threading
+import weakref
+import zlib
+
+import numpy as np
+
+import config
+import letter_masks
+import scoring
+import wordle
+from wordle_guess import Guess, unpack_pattern
+
+PATTERN_TABLE_DIR = "patternTables/"
+
+# Maximum number of guess/answer pairs in a precomputed pattern table.
+# Bigger tables aren't built, hints for them only consider the remaining candidates
+MAX_PATTERN_TABLE_SIZE = 100_000_000
+
+# Maximum number of guess/answer pairs scored on the fly for a hint without a table
+MAX_HINT_PAIRS = 4_000_000
+
+# Number of patterns to count at once when comparing guesses
+ENTROPY_CHUNK_SIZE = 2_000_000
+
+
+class PatternTable:
+    """All words that can be guessed and all possible answers of one length
+    with the same lists and alphabet, and the pattern of every guess against every answer
+    """
+
+    def __init__(self, guesses, answers, letters, matrix):
+        self.guesses = guesses
+        self.answers = answers
+        self.letters = letters
+        self.length = len(answers[0])
+        self.guess_index = {word: i for i, word in enumerate(guesses)}
+        self.encoded_answers = scoring.encode_words(answers, letters)
+        self.matrix = matrix  # None if the table would be too big
+        # Without a table, candidates are narrowed down by their letters before scoring
+        self.answer_masks = (
+            letter_masks.word_masks("".join(answers), self.length)
+            if matrix is None
+            else None
+        )
+        self.best_opening = None
+
+    def patterns(self, guess, candidates):
+        """Returns the patterns of a guess against the candidates (answer indexes)"""
+        row = self.guess_index.get(guess)
+        if self.matrix is not None and row is not None:
+            return self.matrix[row, candidates]
+        encoded = scoring.encode_words([guess], self.letters)[0]
+        return scoring.score(encoded, self.encoded_answers[candidates])
+
+    def may_match(self, guess, pattern, candidates):
+        """Returns which candidates (answer indexes) have all letters a pattern shows
+        are in the answer and none it shows aren't, as a bool array.
+        Only the pattern can tell if they really match"""
+        present = absent = 0
+        for letter_guess in unpack_pattern(guess, pattern):
+            bit = letter_masks.LETTER_BITS.get(letter_guess.letter, letter_masks.OTHER)
+            if letter_guess.guess == Guess.INCORRECT:
+                absent |= bit
+            else:
+                present |= bit
+        # Grey copies of letters that are also yellow or green only limit the count
+        absent &= ~present & ~letter_masks.OTHER
+        masks = self.answer_masks[candidates]
+        return (masks & np.uint64(present) == present) & (
+            masks & np.uint64(absent) == 0
+        )
+
+    def best_guess(self, candidates):
+        """Returns the guess that splits the candidates into the most even groups
+        (highest entropy of the pattern distribution), preferring possible answers"""
+        if len(candidates) <= 2:
+            return self.answers[candidates[0]]
+        opening = len(candidates) == len(self.answers)
+        if opening and self.best_opening is not None:
+            return self.best_opening
+
+        if self.matrix is not None:
+            guesses = self.guesses
+            patterns = self.matrix[:, candidates]
+        else:
+            # Without a table only candidates are considered, as many as can be scored
+            sample = candidates[: max(1, MAX_HINT_PAIRS // len(candidates))]
+            guesses = [self.answers[i] for i in sample]
+            patterns = scoring.score_matrix(
+                self.encoded_answers[sample], self.encoded_answers[candidates]
+            )
+
+        scores = _entropies(patterns, self.length)
+        candidate_words = {self.answers[i] for i in candidates}
+        is_candidate = np.fromiter(
+            (word in candidate_words for word in guesses), bool, len(guesses)
+        )
+        # A small bonus for the chance of guessing right breaks ties
+        scores = scores + is_candidate / len(candidates)
+        best = guesses[int(np.argmax(scores))]
+        if opening:
+            self.best_opening = best
+        return best
+
+
+class GameSolver:
+    """Candidates of one game, narrowed down with each new guess"""
+
+    def __init__(self, table):
+        self.table = table
+        self.candidates = np.arange(len(table.answers))
+        self.applied = 0
+
+    def update(self, game):
+        """Removes the candidates that don't fit the guesses made since the last update"""
+        guesses = game.guesses
+        for i in range(self.applied, len(guesses)):
+            guess, pattern = guesses.word(i), guesses.patterns[i]
+            candidates = self.candidates
+            if self.table.matrix is None:
+                # Scoring is slow without a table, skip candidates with the wrong letters
+                candidates = candidates[
+                    self.table.may_match(guess, pattern, candidates)
+                ]
+            patterns = self.table.patterns(guess, candidates)
+            self.candidates = candidates[patterns == pattern]
+        self.applied = len(guesses)
+
+    def remaining(self):
+        """Number of words that could still be the answer"""
+        return len(self.candidates)
+
+    def hint(self):
+        """Best next guess, or None if no candidate is left"""
+        if not len(self.candidates):
+            return None
+        return self.table.best_guess(self.candidates)
+
+
+def get_solver(game):
+    """Returns the up to date solver of a game"""
+    solver = _solvers.get(game)
+    if solver is None:
+        solver = _solvers.setdefault(game, GameSolver(get_table(game)))
+    solver.update(game)
+    return solver
+
+
+def get_table(game):
+    """Returns the pattern table for the lists, alphabet and word length of a game,
+    loading it from disk or building it if necessary.
+    Tables are made from the loaded lists the game uses, so games started before
+    a list was reloaded keep getting hints for the words they started with.
+    Only games needing the same table wait while it's loaded or built"""
+    key = (game.valid_letters, len(game.word))
+    with _get_build_lock(game.valid_words, key):
+        with _lock:
+            table = _tables.get(game.valid_words, {}).get(key)
+        if table is None:
+            try:
+                table = _load_table(*game.valid_words.word_sets, *key)
+            except (ValueError, OSError) as ex:
+                raise wordle.NoWordsException(
+                    "Hints aren't available for this game!"
+                ) from ex
+            with _lock:
+                _tables.setdefault(game.valid_words, {})[key] = table
+    return table
+
+
+def _get_build_lock(valid_words, key):
+    """Returns the lock that's held while the table of lists and a key is loaded or built"""
+    with _lock:
+        return _build_locks.setdefault(valid_words, {}).setdefault(
+            key, threading.Lock()
+        )
+
+
+def preload_tables(valid_words, letters, lengths):
+    """Loads the saved pattern tables of lists (a view from wordle.get_valid_words),
+    an alphabet and word lengths, so the first hints don't wait for them.
+    Tables that haven't been saved yet aren't built"""
+    for length in lengths:
+        key = (letters, length)
+        with _get_build_lock(valid_words, key):
+            with _lock:
+                if key in _tables.get(valid_words, {}):
+                    continue
+            try:
+                table = _load_table(*valid_words.word_sets, *key, build=False)
+            except (ValueError, OSError, wordle.NoWordsException):
+                continue
+            if table is not None:
+                with _lock:
+                    _tables.setdefault(valid_words, {})[key] = table
+
+
+def _load_table(guess_list, word_list, letters, length, build=True):
+    """Loads or builds a pattern table, returns None instead of building it without build"""
+    answers = sorted(set(word_list.get_buckets(letters).get(length, ())))
+    guesses = sorted(
+        set(guess_list.get_buckets(letters).get(length, ())).union(answers)
+    )
+    if not answers:
+        raise wordle.NoWordsException("There are no words to give hints for!")
+    if len(guesses) * len(answers) > MAX_PATTERN_TABLE_SIZE:
+        return PatternTable(guesses, answers, letters, None)
+
+    # The file name identifies the exact words, so changed lists get a new table
+    checksum = zlib.crc32("\n".join(guesses + answers).encode("UTF-8"))
+    filename = f"{PATTERN_TABLE_DIR}{guess_list.name}_{word_list.name}_{length}_{checksum:08x}.npy"
+    if not os.path.exists(filename):
+        if not build:
+            return None
+        print(f"solver.py: Building pattern table {filename}")
+        matrix = scoring.score_matrix(
+            scoring.encode_words(guesses, letters),
+            scoring.encode_words(answers, letters),
+        )
+        os.makedirs(PATTERN_TABLE_DIR, exist_ok=True)
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as file:
+            np.save(file, matrix)
+        os.replace(temporary_filename, filename)
+    matrix = np.load(filename, mmap_mode="r")
+    return PatternTable(guesses, answers, letters, matrix)
+
+
+def _entropies(patterns, length):
+    """Returns the entropy of the pattern distribution of each row"""
+    chunk = max(1, ENTROPY_CHUNK_SIZE // patterns.shape[1])
+    return np.concatenate(
+        [
+            _chunk_entropies(np.asarray(patterns[start : start + chunk]), length)
+            for start in range(0, len(patterns), chunk)
+        ]
+    )
+
+
+def _chunk_entropies(patterns, length):
+    rows, columns = patterns.shape
+    if 3**length * rows <= ENTROPY_CHUNK_SIZE:
+        # Count patterns per row by offsetting each row into its own range of bins
+        pattern_count = 3**length
+        keys = patterns + np.arange(rows, dtype=np.int64)[:, np.newaxis] * pattern_count
+        counts = np.bincount(keys.ravel(), minlength=rows * pattern_count).reshape(
+            rows, pattern_count
+        )
+    else:
+        # Too many possible patterns for bins, count equal values in sorted rows
+        keys = np.sort(patterns, axis=1).astype(np.int64)
+        keys += np.arange(rows, dtype=np.int64)[:, np.newaxis] << 32
+        _, index, counts = np.unique(
+            keys.ravel(), return_index=True, return_counts=True
+        )
+        counts = np.bincount(
+            index // columns, weights=counts * np.log2(counts), minlength=rows
+        )
+        return np.log2(columns) - counts / columns
+    with np.errstate(divide="ignore", invalid="ignore"):
+        information = np.where(counts > 0, counts * np.log2(counts), 0.0)
+    return np.log2(columns) - information.sum(axis=1) / columns
+
+
+# Load optional settings from config
+if hasattr(config, "MAX_PATTERN_TABLE_SIZE"):
+    MAX_PATTERN_TABLE_SIZE = config.MAX_PATTERN_TABLE_SIZE
+
+_lock = threading.Lock()
+# Pattern tables by guess validation view (see wordle.get_valid_words), letters and length
+_tables = weakref.WeakKeyDictionary()
+# Locks held while a table is loaded or built, by view and by letters and length
+_build_locks = weakref.WeakKeyDictionary()
+_solvers = weakref.WeakKeyDictionary()
@@ -0,0 +1,180 @@
+"""Keeps the wordle states of all channels, persisted with write-behind to a state store"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+import config
+import wordle
+
+# SQLite database file for wordle states (None to keep them in memory only)
+STATE_DATABASE = "wortlerino.db"
+
+# Function returning the StateStore to use instead, e.g. one backed by a database
+# that several machines share (None for SQLite, or memory if STATE_DATABASE is None)
+STATE_BACKEND = None
+
+# Seconds between writing changed states to the database
+STATE_FLUSH_INTERVAL = 5
+
+# Seconds after which a channel's state is removed from memory if it isn't used
+# (it's loaded again from the database with the next message, None to keep all states)
+STATE_IDLE_TIMEOUT = 3600
+
+
+class StateStore:
+    """Stores serialized wordle states by channel ID, without persisting them"""
+
+    def __init__(self):
+        self.states = {}
+
+    def load(self, channel_id):
+        """Returns the stored state data of a channel, or None"""
+        return self.states.get(channel_id)
+
+    def save_many(self, states):
+        """Stores the state data of many channels at once"""
+        self.states.update(states)
+
+    def close(self):
+        """Releases the store's resources"""
+
+
+class SQLiteStateStore(StateStore):
+    """Stores serialized wordle states in a SQLite database"""
+
+    def __init__(self, filename):
+        super().__init__()
+        self.lock = threading.Lock()
+        # Several shard processes may use the same database
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS states ("
+                "channel_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def load(self, channel_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM states WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, states):
+        now = time.time()
+        rows = [
+            (channel_id, json.dumps(data, separators=(",", ":")), now)
+            for channel_id, data in states.items()
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO states (channel_id, data, updated) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class StateCache:
+    """Wordle states of recently active channels, backed by a state store.
+    Changed states are written in batches by flush(), idle states are evicted
+    and loaded again on demand"""
+
+    def __init__(self, store, idle_timeout=None):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.states = {}
+        self.last_used = {}
+        self.dirty = {}  # Snapshots of changed states that haven't been written yet
+        self.flushing = {}  # Snapshots that are being written right now
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_task = None
+
+    def get(self, channel_id):
+        """Returns the state of a channel, loading or creating it if necessary"""
+        with self.lock:
+            self.last_used[channel_id] = time.monotonic()
+            if channel_id in self.states:
+                return self.states[channel_id]
+            data = self.dirty.get(channel_id) or self.flushing.get(channel_id)
+        if data is None:
+            data = self.store.load(channel_id)
+        state = wordle.WordleState.from_dict(data) if data else wordle.WordleState()
+        with self.lock:
+            return self.states.setdefault(channel_id, state)
+
+    def mark_changed(self, channel_id, state):
+        """Takes a snapshot of a changed state to be written with the next flush.
+        Call this while nothing else can change the state"""
+        data = state.to_dict()
+        with self.lock:
+            self.dirty[channel_id] = data
+
+    def flush(self):
+        """Writes all changed states to the store"""
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.dirty = self.dirty, {}
+            if self.flushing:
+                self.store.save_many(self.flushing)
+            with self.lock:
+                self.flushing = {}
+
+    def evict_idle(self):
+        """Removes states that haven't been used for a while from memory"""
+        if self.idle_timeout is None:
+            return
+        deadline = time.monotonic() - self.idle_timeout
+        with self.lock:
+            for channel_id, last_used in list(self.last_used.items()):
+                if last_used < deadline:
+                    del self.last_used[channel_id]
+                    self.states.pop(channel_id, None)
+
+    def start_flushing(self, interval):
+        """Flushes and evicts every interval seconds from now on"""
+        if self.flush_task is None:
+            self.flush_task = asyncio.get_running_loop().create_task(
+                self._flush_periodically(interval)
+            )
+
+    async def _flush_periodically(self, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, self.flush)
+            self.evict_idle()
+
+    def close(self):
+        """Writes remaining changes and closes the store"""
+        self.flush()
+        self.store.close()
+
+
+def create_store():
+    """Returns the configured state store"""
+    if STATE_BACKEND is not None:
+        return STATE_BACKEND()
+    if STATE_DATABASE:
+        return SQLiteStateStore(STATE_DATABASE)
+    return StateStore()
+
+
+# Load optional settings from config
+if hasattr(config, "STATE_DATABASE"):
+    STATE_DATABASE = config.STATE_DATABASE
+if hasattr(config, "STATE_BACKEND"):
+    STATE_BACKEND = config.STATE_BACKEND
+if hasattr(config, "STATE_FLUSH_INTERVAL"):
+    STATE_FLUSH_INTERVAL = config.STATE_FLUSH_INTERVAL
+if hasattr(config, "STATE_IDLE_TIMEOUT"):
+    STATE_IDLE_TIMEOUT = config.STATE_IDLE_TIMEOUT
+
+states = StateCache(create_store(), STATE_IDLE_TIMEOUT)
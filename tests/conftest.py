@@ -0,0 +1,12 @@
+"""Lets the tests run without a config.py, with the default settings"""
+
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # pylint: disable=unused-import
+except ImportError:
+    sys.modules["config"] = types.ModuleType("config")
@@ -0,0 +1,44 @@
+"""Checks uploading custom word lists, without downloading them"""
+
+import os
+
+import pytest
+
+import custom_lists
+import word_lists
+
+
+@pytest.fixture(name="guild_dir")
+def fixture_guild_dir(tmp_path, monkeypatch):
+    """Saves custom lists in a temporary directory, returns the one of server 1"""
+    monkeypatch.setattr(word_lists, "WORD_LIST_DIR", f"{tmp_path}/")
+    monkeypatch.setattr(custom_lists, "lists", {})
+    monkeypatch.setattr(custom_lists, "MAX_CUSTOM_LISTS", 2)
+    directory = tmp_path / custom_lists.CUSTOM_LIST_DIR / "1"
+    directory.mkdir(parents=True)
+    return directory
+
+
+def upload(directory, name, words):
+    """Checks and adds a list like the upload command, with the file already there"""
+    text = "\n".join(words).encode("UTF-8")
+    custom_lists.check_upload(1, name, len(text), ["Wordle"])
+    temporary = directory / f"{name}.tmp"
+    temporary.write_bytes(text)
+    return custom_lists.add(1, name, str(temporary))
+
+
+def test_names_ignore_case(guild_dir):
+    upload(guild_dir, "Foo", ["apple"])
+    upload(guild_dir, "bar", ["berry"])
+    with pytest.raises(custom_lists.UploadException):
+        upload(guild_dir, "baz", ["cherry"])  # Over the limit
+    with pytest.raises(custom_lists.UploadException):
+        upload(guild_dir, "wordle", ["cherry"])  # Reserved
+
+    # Replaces Foo, even though the server is at the limit
+    loaded = upload(guild_dir, "foo", ["grape", "lemon"])
+    assert len(loaded) == 2
+    assert sorted(custom_lists.get_lists(1)) == ["bar", "foo"]
+    assert custom_lists.find_name(1, "FOO") == "foo"
+    assert sorted(os.listdir(guild_dir)) == ["bar.txt", "foo.txt"]
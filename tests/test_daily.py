@@ -0,0 +1,41 @@
+"""Checks that daily words only depend on the words of a list, not its format"""
+
+import shutil
+
+import daily
+import word_lists
+import wordle
+
+
+def load_all_formats(tmp_path, name):
+    """Returns a word list loaded from text, compiled and as word graph"""
+    filename = str(tmp_path / f"{name}.txt")
+    shutil.copy(f"{word_lists.WORD_LIST_DIR}{name}.txt", filename)
+    word_lists.compile_word_list(filename)
+    word_lists.compile_word_graph(filename)
+    return [
+        word_lists.WordList.from_file(name, filename),
+        word_lists.MappedWordList(name, word_lists.get_compiled_filename(filename)),
+        word_lists.GraphWordList(name, word_lists.get_graph_filename(filename)),
+    ]
+
+
+def test_text_and_compiled_lists_agree(tmp_path):
+    for name in ("spelunky", "substantive"):
+        loaded = load_all_formats(tmp_path, name)
+        for alphabet in wordle.LETTERS.values():
+            for min_length, max_length in ((5, 5), (4, 6), (3, 10)):
+                schedules = [
+                    daily.get_schedule(
+                        word_list, alphabet["letters"], min_length, max_length
+                    )
+                    for word_list in loaded
+                ]
+                if schedules[0] is None:
+                    assert schedules == [None] * len(loaded)
+                    continue
+                days = range(len(schedules[0]))
+                words = [[s.word(day) for day in days] for s in schedules]
+                assert words[1] == words[0] and words[2] == words[0]
+                boards = [[s.words(day, 4) for day in days[:50]] for s in schedules]
+                assert boards[1] == boards[0] and boards[2] == boards[0]
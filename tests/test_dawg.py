@@ -0,0 +1,104 @@
+"""Compares word graphs with the compiled word lists they were built from"""
+
+import random
+import shutil
+
+import pytest
+
+import dawg
+import word_lists
+import wordle
+from wordle_guess import pack_pattern
+
+
+@pytest.fixture(name="compiled", params=["wordle-answers", "spelunky", "substantive"])
+def fixture_compiled(request, tmp_path):
+    """Returns a word list compiled as .bin and as word graph"""
+    filename = str(tmp_path / f"{request.param}.txt")
+    shutil.copy(f"{word_lists.WORD_LIST_DIR}{request.param}.txt", filename)
+    word_lists.compile_word_list(filename)
+    word_lists.compile_word_graph(filename)
+    return (
+        word_lists.MappedWordList(
+            request.param, word_lists.get_compiled_filename(filename)
+        ),
+        word_lists.GraphWordList(
+            request.param, word_lists.get_graph_filename(filename)
+        ),
+    )
+
+
+def feedback(guess, answer):
+    return wordle.WordleGame(answer, None, None)._analyze_guess(guess)
+
+
+def test_words(compiled):
+    mapped, graph = compiled
+    assert len(graph) == len(mapped)
+    for length, partition in mapped.partitions.items():
+        assert graph.graph.count(length) == len(partition)
+        assert [word for _, word in graph.graph.words(length)] == list(partition)
+        assert all(word in graph for word in partition)
+    assert "wortlerino" * 2 not in graph
+
+
+def test_search_from_guesses(compiled):
+    mapped, graph = compiled
+    rng = random.Random(0)
+    for length, partition in mapped.partitions.items():
+        words = list(partition)
+        for _ in range(10):
+            answer = rng.choice(words)
+            guesses = rng.sample(words, min(len(words), rng.randint(1, 3)))
+            rows = [feedback(guess, answer) for guess in guesses]
+            expected = [
+                word
+                for word in words
+                if all(
+                    pack_pattern(feedback(guess, word)) == pack_pattern(row)
+                    for guess, row in zip(guesses, rows)
+                )
+            ]
+            constraints = dawg.Constraints.from_guesses(rows, length)
+            assert graph.search(constraints) == expected
+
+
+def test_search_from_pattern(compiled):
+    mapped, graph = compiled
+    rng = random.Random(0)
+    for length, partition in mapped.partitions.items():
+        words = list(partition)
+        for _ in range(10):
+            # Every other letter of a word, without a letter it doesn't have
+            word = rng.choice(words)
+            pattern = "".join(c if i % 2 == 0 else "_" for i, c in enumerate(word))
+            excluded = rng.choice([c for c in "aeiourstln" if c not in word])
+            expected = [
+                other
+                for other in words
+                if all(c in ("_", o) for c, o in zip(pattern, other))
+                and excluded not in other
+            ]
+            constraints = dawg.Constraints.from_pattern(pattern, excluded)
+            assert graph.search(constraints) == expected
+
+
+def test_sample(compiled):
+    mapped, graph = compiled
+    for length, partition in mapped.partitions.items():
+        rng = random.Random(length)
+        expected_rng = random.Random(length)
+        for _ in range(20):
+            expected = partition[expected_rng.randrange(len(partition))]
+            assert graph.graph.sample(length, rng) == expected
+    assert graph.graph.sample(max(mapped.partitions) + 1, random.Random()) is None
+
+
+def test_buckets(compiled):
+    mapped, graph = compiled
+    for alphabet in wordle.LETTERS.values():
+        mapped_buckets = mapped.get_buckets(alphabet["letters"])
+        graph_buckets = graph.get_buckets(alphabet["letters"])
+        assert graph_buckets.keys() == mapped_buckets.keys()
+        for length, bucket in graph_buckets.items():
+            assert list(bucket) == list(mapped_buckets[length])
@@ -0,0 +1,38 @@
+"""Checks the Prometheus text endpoint"""
+
+import asyncio
+import socket
+
+import metrics
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_serves_metrics():
+    async def main():
+        port = free_port()
+        await metrics._serve(port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        metrics._server.close()
+        return response
+
+    assert b"wortlerino_messages_total" in asyncio.run(main())
+
+
+def test_reports_port_in_use(capsys):
+    async def main(port):
+        await metrics._serve(port)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        asyncio.run(main(port))
+    assert f"Couldn't serve metrics on port {port}" in capsys.readouterr().out
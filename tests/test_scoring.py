@@ -0,0 +1,52 @@
+"""Checks that the NumPy scoring gives the same patterns as WordleGame._analyze_guess"""
+
+import itertools
+import random
+
+import scoring
+import wordle
+from wordle_guess import pack_pattern
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def expected_patterns(guess, answers, letters=LETTERS):
+    """Patterns of a guess against answers, scored one by one like a WordleGame"""
+    return [
+        pack_pattern(wordle.WordleGame(answer, letters, None)._analyze_guess(guess))
+        for answer in answers
+    ]
+
+
+def test_repeated_letters():
+    words = ["speed", "abide", "erase", "steal", "crepe", "eerie", "geese", "sheep"]
+    for guess in words:
+        assert scoring.score_words(guess, words, LETTERS) == expected_patterns(
+            guess, words
+        )
+
+
+def test_all_words_of_a_small_alphabet():
+    # Every word of 4 letters out of 3, so most have repeated letters
+    words = ["".join(word) for word in itertools.product("abc", repeat=4)]
+    for guess in words:
+        assert scoring.score_words(guess, words, "abc") == expected_patterns(
+            guess, words, "abc"
+        )
+
+
+def test_random_words():
+    rng = random.Random(0)
+    for length in (3, 5, 6, 11):
+        words = ["".join(rng.choices("aeinrst", k=length)) for _ in range(50)]
+        for guess in words[:10]:
+            assert scoring.score_words(guess, words, LETTERS) == expected_patterns(
+                guess, words
+            )
+
+
+def test_multi_wordle_boards():
+    game = wordle.MultiWordleGame(["eerie", "geese", "sheep"], LETTERS, None)
+    game._add_guess("speed")
+    for board, answer in zip(game.boards, game.words):
+        assert board.patterns[-1] == expected_patterns("speed", [answer])[0]
@@ -0,0 +1,126 @@
+"""Runs the send scheduler against fake channels"""
+
+import asyncio
+import time
+
+import sending
+
+
+class FakeFile:
+    filename = "guesses.png"
+
+
+class FakeChannel:
+    """Records what it got and when, uploads take upload_time seconds"""
+
+    def __init__(self, channel_id, upload_time=0, uploads=None, fail=False):
+        self.id = channel_id
+        self.upload_time = upload_time
+        self.uploads = uploads  # Shared [uploading, most uploading at once]
+        self.fail = fail
+        self.received = []
+
+    async def send(self, embed=None, file=None):
+        if self.fail:
+            raise ConnectionError("can't send")
+        if file is not None and self.uploads is not None:
+            self.uploads[0] += 1
+            self.uploads[1] = max(self.uploads)
+        try:
+            await asyncio.sleep(self.upload_time)
+        finally:
+            if file is not None and self.uploads is not None:
+                self.uploads[0] -= 1
+        self.received.append((time.monotonic(), embed))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_burst_then_rate_limit():
+    async def main():
+        scheduler = sending.SendScheduler(rate=10, burst=3, max_uploads=8)
+        channel = FakeChannel(1)
+        start = time.monotonic()
+        sent = [scheduler.send(channel, i) for i in range(6)]
+        assert await asyncio.gather(*sent) == [True] * 6
+        return [t - start for t, _ in channel.received], channel
+
+    times, channel = run(main())
+    assert [embed for _, embed in channel.received] == list(range(6))
+    assert times[2] < 0.05  # The burst goes out at once
+    assert times[5] >= 0.29  # Then one message every 1 / 10 seconds
+
+
+def test_replaceable_board_is_dropped():
+    async def main():
+        scheduler = sending.SendScheduler(rate=20, burst=1, max_uploads=8)
+        channel = FakeChannel(1)
+        first = scheduler.send(channel, "first")
+        board = scheduler.send(channel, "old board", FakeFile(), replaceable=True)
+        newer = scheduler.send(channel, "new board", FakeFile(), replaceable=True)
+        results = await asyncio.gather(first, board, newer)
+        return results, scheduler, channel
+
+    results, scheduler, channel = run(main())
+    assert results == [True, False, True]
+    assert scheduler.dropped == 1
+    assert [embed for _, embed in channel.received] == ["first", "new board"]
+
+
+def test_upload_limit():
+    async def main():
+        scheduler = sending.SendScheduler(rate=20, burst=5, max_uploads=2)
+        uploads = [0, 0]
+        channels = [FakeChannel(i, 0.02, uploads) for i in range(6)]
+        sent = [scheduler.send(channel, "board", FakeFile()) for channel in channels]
+        sent += [scheduler.send(channel, "text") for channel in channels]
+        assert all(await asyncio.gather(*sent))
+        return uploads
+
+    assert run(main()) == [0, 2]
+
+
+def test_failed_send():
+    async def main():
+        scheduler = sending.SendScheduler(rate=20, burst=5, max_uploads=2)
+        failed = scheduler.send(FakeChannel(1, fail=True), "text")
+        sent = scheduler.send(FakeChannel(2), "text")
+        return await asyncio.gather(failed, sent), scheduler
+
+    results, scheduler = run(main())
+    assert results == [False, True]
+    assert scheduler.pending == 0 and not scheduler.channels
+
+
+def test_idle_channels_are_forgotten():
+    async def main():
+        scheduler = sending.SendScheduler(rate=100, burst=2, max_uploads=8)
+        for i in range(50):
+            scheduler.send(FakeChannel(i), "text")
+        await scheduler.drain()
+        assert not scheduler.channels
+        assert len(scheduler.idle) == 50  # They could still be rate limited
+        await asyncio.sleep(0.05)
+        scheduler.send(FakeChannel(50), "text")
+        await scheduler.drain()
+        return scheduler
+
+    scheduler = run(main())
+    assert not scheduler.channels
+    assert list(scheduler.idle) == [50]
+
+
+def test_rate_limit_outlasts_the_queue():
+    async def main():
+        scheduler = sending.SendScheduler(rate=10, burst=2, max_uploads=8)
+        channel = FakeChannel(1)
+        await asyncio.gather(*(scheduler.send(channel, i) for i in range(2)))
+        await scheduler.drain()
+        assert not scheduler.channels
+        start = time.monotonic()
+        await scheduler.send(channel, 2)
+        return time.monotonic() - start
+
+    assert run(main()) >= 0.09  # Waited for the bucket instead of a new burst
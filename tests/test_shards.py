@@ -0,0 +1,31 @@
+"""Checks how shard processes are configured"""
+
+import multiprocessing
+
+import metrics
+import shards
+
+
+def _report_port(shard_id, shard_count, connection):
+    shards.set_shard(shard_id, shard_count)
+    connection.send(metrics.METRICS_PORT)
+
+
+def test_each_shard_has_its_own_metrics_port(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_PORT", 9000)
+    context = multiprocessing.get_context("fork")
+    ports = []
+    for shard_id in range(3):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_report_port, args=(shard_id, 3, sender))
+        process.start()
+        ports.append(receiver.recv())
+        process.join()
+    assert ports == [9000, 9001, 9002]
+    assert metrics.METRICS_PORT == 9000  # The parent keeps the configured port
+
+
+def test_shard_for():
+    assert shards.shard_for(0, 2) == 0
+    assert shards.shard_for(1 << 22, 2) == 1
+    assert shards.shard_for(3 << 22, 2) == 1
@@ -0,0 +1,42 @@
+"""Checks that stored wordle states come back the same"""
+
+import json
+import random
+
+import word_lists
+import wordle
+
+
+def test_restore_games():
+    random.seed(0)
+    for boards in (1, 3):
+        state = wordle.WordleState()
+        state.boards = boards
+        state.create_game()
+        words = word_lists.cache.get(state.guess_list).get_buckets(
+            state.valid_letters["letters"]
+        )[len(state.game.words[0])]
+        for _ in range(3):
+            state.game.guess(random.choice(words))
+
+        data = json.loads(json.dumps(state.to_dict()))
+        restored = wordle.WordleState.from_dict(data)
+        assert type(restored.game) is type(state.game)
+        assert restored.to_dict() == state.to_dict()
+        if boards == 1:
+            assert list(restored.game.guesses.patterns) == list(
+                state.game.guesses.patterns
+            )
+        else:
+            for board, restored_board in zip(state.game.boards, restored.game.boards):
+                assert list(restored_board.patterns) == list(board.patterns)
+
+
+def test_restore_without_word_lists():
+    state = wordle.WordleState()
+    state.create_game()
+    data = json.loads(json.dumps(state.to_dict()))
+    data["game"]["lists"] = ["gone"]
+    restored = wordle.WordleState.from_dict(data)
+    assert restored.game.word == state.game.word
+    assert restored.game.valid_words.names() == state.game.valid_words.names()
@@ -0,0 +1,142 @@
+"""Warms up what games need in the background after connecting to discord, instead
+of before: word lists and their indexes, the letter squares of board images and
+saved pattern tables. Prints how long connecting and each stage took
+
+Until a word list is warmed up, commands that need it get a "still warming up"
+reply instead of waiting for it (see word_lists.WordListCache.get)"""
+
+import asyncio
+import os
+import threading
+import time
+
+import config
+import image_guesses
+import solver
+import word_lists
+import wordle
+from wordle_guess import Guess
+
+# Load word lists in the background after connecting (False to load each one
+# when it's first used, like before)
+WARMUP_ENABLED = True
+
+# Names of the word lists to warm up (None for all lists of wordle.WORD_LISTS),
+# they're loaded smallest first until the word list cache is full
+WARMUP_WORD_LISTS = None
+
+
+class Warmup:
+    """Stages of the startup and how long each one took"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = []  # (stage, seconds) in the order they finished
+        self.ready = threading.Event()
+        self.task = None
+
+    def time_stage(self, stage, function, *args):
+        """Runs one stage and records how long it took, returns False if it failed"""
+        start = time.perf_counter()
+        try:
+            function(*args)
+        except OSError as ex:
+            print(f"warmup.py: {stage} failed: {ex}")
+            return False
+        finally:
+            self.timings.append((stage, time.perf_counter() - start))
+        return True
+
+    def start(self):
+        """Records the time until connecting and starts warming up in the background.
+        Only the first call does something"""
+        if self.task is not None or self.ready.is_set():
+            return
+        self.timings.append(("connect", time.perf_counter() - self.started))
+        if not WARMUP_ENABLED:
+            self.ready.set()
+            return
+        entries = get_word_lists()
+        word_lists.cache.will_warm_up(entries)
+        self.task = asyncio.get_running_loop().run_in_executor(None, self.run, entries)
+
+    def run(self, entries):
+        """Warms up everything, blocks until it's done"""
+        try:
+            self.time_stage("glyphs", warm_glyphs)
+            warmed = []
+            for entry in entries:
+                if not self.time_stage(entry["name"], warm_word_list, entry):
+                    continue
+                if not all(map(word_lists.cache.is_loaded, warmed)):
+                    break  # The cache is full, other lists were unloaded for this one
+                warmed.append(entry)
+            self.time_stage("pattern tables", warm_pattern_tables)
+        finally:
+            with word_lists.cache.lock:
+                word_lists.cache.warming.clear()
+            self.ready.set()
+            print(self.report())
+
+    def report(self):
+        """Returns the timings of all stages as one line"""
+        total = time.perf_counter() - self.started
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.timings)
+        state = "Ready" if self.ready.is_set() else "Warming up"
+        return f"warmup.py: {state} after {total:.2f}s ({stages})"
+
+
+def get_word_lists():
+    """Returns the entries of the lists to warm up, smallest first"""
+    if WARMUP_WORD_LISTS is None:
+        entries = list(wordle.WORD_LISTS.values())
+    else:
+        entries = [wordle.WORD_LISTS[name] for name in WARMUP_WORD_LISTS]
+
+    def size(entry):
+        try:
+            return os.path.getsize(word_lists.WORD_LIST_DIR + entry["filename"])
+        except OSError:
+            return 0  # Fails quickly when it's loaded
+
+    return sorted(entries, key=size)
+
+
+def warm_glyphs():
+    """Draws the squares of all letters of all alphabets"""
+    for alphabet in wordle.LETTERS.values():
+        for letter in alphabet["letters"]:
+            for guess in Guess:
+                image_guesses.get_tile(letter, guess)
+
+
+def warm_word_list(entry):
+    """Loads a word list and indexes its words for the default alphabet"""
+    loaded = word_lists.cache.warm_up(entry)
+    loaded.get_buckets(wordle.LETTERS[wordle.DEFAULT_ALPHABET]["letters"])
+
+
+def warm_pattern_tables():
+    """Loads the saved pattern tables for the default settings"""
+    valid_words = wordle.get_valid_words(
+        word_lists.cache.get(wordle.WORD_LISTS[wordle.DEFAULT_GUESS_LIST]),
+        word_lists.cache.get(wordle.WORD_LISTS[wordle.DEFAULT_WORD_LIST]),
+    )
+    solver.preload_tables(
+        valid_words,
+        wordle.LETTERS[wordle.DEFAULT_ALPHABET]["letters"],
+        range(wordle.DEFAULT_MIN_LENGTH, wordle.DEFAULT_MAX_LENGTH + 1),
+    )
+    _warm_views.append(valid_words)
+
+
+# Load optional settings from config
+if hasattr(config, "WARMUP_ENABLED"):
+    WARMUP_ENABLED = config.WARMUP_ENABLED
+if hasattr(config, "WARMUP_WORD_LISTS"):
+    WARMUP_WORD_LISTS = config.WARMUP_WORD_LISTS
+
+# Views of the warmed up pattern tables, kept so the tables stay loaded
+_warm_views = []
+
+warmup = Warmup()
@@ -0,0 +1,498 @@
+"""Loads word lists on demand and keeps the recently used ones in memory"""
+
+import array
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import unicodedata
+
+import numpy as np
+
+import config
+import dawg
+import letter_masks
+
+WORD_LIST_DIR = "wordLists/"
+
+# Compiled word list format (see compile_word_lists.py):
+#   header: magic, byte order marker, number of partitions
+#   partition table: word length, word count, offsets position, data position
+#   per partition: word count + 1 uint32 offsets into its data,
+#   then the sorted UTF-8 encoded words of that length, concatenated
+BINARY_MAGIC = b"WRDL"
+BINARY_BYTE_ORDER = 0x01020304
+HEADER = struct.Struct("=4sII")
+PARTITION = struct.Struct("=IIII")
+
+# Maximum number of words kept loaded across all word lists (None for no limit)
+WORD_LIST_CACHE_SIZE = 1_000_000
+
+# Seconds between checking loaded word lists for changed files (None to never check)
+WORD_LIST_WATCH_INTERVAL = None
+
+
+class WordList:
+    """A loaded word list with its lookup indexes"""
+
+    def __init__(self, name, words):
+        self.name = name
+        self.word_set = set()
+        # Sorted words by length, in the same order as in the compiled formats,
+        # so everything that numbers words (like daily.Schedule) works the same
+        self.lengths = collections.defaultdict(list)
+        for word in words:
+            if word and word not in self.word_set:
+                self.word_set.add(word)
+                self.lengths[len(word)].append(word)
+        for words_of_length in self.lengths.values():
+            words_of_length.sort()
+        # Letter masks of the words by length (see letter_masks.py)
+        self.masks = {
+            length: letter_masks.word_masks("".join(words), length)
+            for length, words in self.lengths.items()
+        }
+        self.buckets = {}  # Eligible words by length, one dict per alphabet
+
+    @classmethod
+    def from_file(cls, name, filename):
+        """Loads a word list text file line by line, so the file's text is never
+        kept in memory as a whole"""
+        with open(filename, encoding="UTF-8") as file:
+            return cls(name, read_words(file))
+
+    def __contains__(self, word):
+        return word in self.word_set
+
+    def __len__(self):
+        return len(self.word_set)
+
+    def get_buckets(self, letters):
+        """Returns the words that can be chosen with an alphabet, bucketed by length.
+        Built on first use and cached"""
+        if letters not in self.buckets:
+            buckets = {}
+            for length, words in self.lengths.items():
+                eligible = tuple(
+                    words[i] for i in _find_eligible(words, self.masks[length], letters)
+                )
+                if eligible:
+                    buckets[length] = eligible
+            self.buckets[letters] = buckets
+        return self.buckets[letters]
+
+
+class MappedWordList:
+    """A compiled word list, memory-mapped and queried directly on the mapped buffer"""
+
+    def __init__(self, name, filename):
+        self.name = name
+        with open(filename, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byte_order, partition_count = HEADER.unpack_from(self.buffer)
+        if magic != BINARY_MAGIC or byte_order != BINARY_BYTE_ORDER:
+            raise OSError(f"{filename} is not a compiled word list for this machine")
+        self.partitions = {}
+        for i in range(partition_count):
+            length, count, offsets_pos, data_pos = PARTITION.unpack_from(
+                self.buffer, HEADER.size + i * PARTITION.size
+            )
+            offsets = memoryview(self.buffer)[
+                offsets_pos : offsets_pos + (count + 1) * 4
+            ].cast("I")
+            self.partitions[length] = _Partition(self.buffer, offsets, data_pos)
+        self.masks = {}  # Letter masks of the words by length, built on first use
+        self.buckets = {}  # Indexes of eligible words by length, one dict per alphabet
+
+    def __contains__(self, word):
+        partition = self.partitions.get(len(word))
+        return partition is not None and partition.contains(word)
+
+    def __len__(self):
+        return sum(map(len, self.partitions.values()))
+
+    def get_buckets(self, letters):
+        """Returns the words that can be chosen with an alphabet, bucketed by length.
+        Built on first use and cached, only word indexes are kept in memory"""
+        if letters not in self.buckets:
+            buckets = {}
+            for length, partition in self.partitions.items():
+                if length not in self.masks:
+                    self.masks[length] = letter_masks.word_masks(
+                        partition.text(), length
+                    )
+                indexes = array.array(
+                    "I", _find_eligible(partition, self.masks[length], letters)
+                )
+                if indexes:
+                    buckets[length] = _Bucket(partition, indexes)
+            self.buckets[letters] = buckets
+        return self.buckets[letters]
+
+
+class GraphWordList:
+    """A compiled word graph (see dawg.py), memory-mapped and queried directly"""
+
+    def __init__(self, name, filename):
+        self.name = name
+        self.graph = dawg.Dawg.load(filename)
+        self.masks = {}  # Letter masks of the words by length, built on first use
+        self.buckets = {}  # Indexes of eligible words by length, one dict per alphabet
+
+    def __contains__(self, word):
+        return word in self.graph
+
+    def __len__(self):
+        return len(self.graph)
+
+    def get_buckets(self, letters):
+        """Returns the words that can be chosen with an alphabet, bucketed by length.
+        Built on first use and cached, only word indexes are kept in memory"""
+        if letters not in self.buckets:
+            buckets = {}
+            for length in self.graph.roots:
+                if length not in self.masks:
+                    self.masks[length] = self.graph.word_masks(
+                        length, letter_masks.word_mask
+                    )
+                words = _GraphWords(self.graph, length)
+                indexes = array.array(
+                    "I", _find_eligible(words, self.masks[length], letters)
+                )
+                if indexes:
+                    buckets[length] = _Bucket(words, indexes)
+            self.buckets[letters] = buckets
+        return self.buckets[letters]
+
+    def search(self, constraints):
+        """Returns the words that fit a dawg.Constraints"""
+        return self.graph.search(constraints)
+
+
+class _GraphWords:
+    """Sequence of the sorted words of one length in a word graph"""
+
+    def __init__(self, graph, length):
+        self.graph = graph
+        self.length = length
+
+    def __len__(self):
+        return self.graph.count(self.length)
+
+    def __getitem__(self, index):
+        return self.graph.word(self.length, index)
+
+
+class _Partition:
+    """Sorted words of one length inside a compiled word list"""
+
+    def __init__(self, buffer, offsets, data_pos):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.data_pos = data_pos
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.raw(index).decode("UTF-8")
+
+    def text(self):
+        """Returns all words concatenated"""
+        return self.buffer[self.data_pos : self.data_pos + self.offsets[-1]].decode(
+            "UTF-8"
+        )
+
+    def raw(self, index):
+        """Returns the encoded word at index"""
+        start = self.data_pos + self.offsets[index]
+        end = self.data_pos + self.offsets[index + 1]
+        return self.buffer[start:end]
+
+    def contains(self, word):
+        """Binary search for a word"""
+        encoded = word.encode("UTF-8")
+        index = bisect.bisect_left(_RawWords(self), encoded)
+        return index < len(self) and self.raw(index) == encoded
+
+
+class _RawWords:
+    """Sequence of the encoded words of a partition, for bisect"""
+
+    def __init__(self, partition):
+        self.partition = partition
+
+    def __len__(self):
+        return len(self.partition)
+
+    def __getitem__(self, index):
+        return self.partition.raw(index)
+
+
+class _Bucket:
+    """Sequence of the eligible words of one length in a compiled word list"""
+
+    def __init__(self, partition, indexes):
+        self.partition = partition
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, index):
+        return self.partition[self.indexes[index]]
+
+
+class StillLoadingException(Exception):
+    """Exception when a word list is needed right away but is still being loaded"""
+
+
+class WordListCache:
+    """Least recently used cache of loaded word lists, capped by total number of words"""
+
+    def __init__(self, max_words=None):
+        self.max_words = max_words
+        self.word_lists = collections.OrderedDict()  # Loaded lists by file name
+        self.versions = {}  # Entry and file version of each loaded list by file name
+        self.loading = {}  # Locks of the lists that are being loaded by file name
+        self.warming = set()  # File names of the lists that are going to be warmed up
+        self.lock = threading.Lock()
+
+    def get(self, word_list, wait=True):
+        """Returns the loaded word list for a word list entry, loading it if necessary.
+        Lists are loaded without holding the lock, so loaded lists can be used
+        meanwhile, and a list that's already being loaded is waited for instead of
+        loaded twice. Raises OSError if the file can't be read, and
+        StillLoadingException without wait if the list is going to be warmed up"""
+        key = word_list["filename"]
+        with self.lock:
+            if key in self.word_lists:
+                self.word_lists.move_to_end(key)
+                return self.word_lists[key]
+            if not wait and key in self.warming:
+                raise StillLoadingException(word_list["name"])
+            load_lock = self.loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self.lock:
+                if key in self.word_lists:
+                    return self.word_lists[key]  # Loaded while waiting for the lock
+            try:
+                loaded = self._load(word_list)
+                version = _get_version(word_list)
+            except BaseException:
+                with self.lock:
+                    self._done_loading(key, load_lock)
+                raise
+            with self.lock:
+                self._put(word_list, loaded, version)
+                self._done_loading(key, load_lock)
+            return loaded
+
+    def _done_loading(self, key, load_lock):
+        if self.loading.get(key) is load_lock:
+            del self.loading[key]
+
+    def is_loaded(self, word_list):
+        """Checks if a list is in the cache"""
+        with self.lock:
+            return word_list["filename"] in self.word_lists
+
+    def warm_up(self, word_list):
+        """Loads a list that was marked with will_warm_up"""
+        try:
+            return self.get(word_list)
+        finally:
+            with self.lock:
+                self.warming.discard(word_list["filename"])
+
+    def will_warm_up(self, word_lists):
+        """Marks lists that are going to be loaded by warm_up, until then they aren't
+        loaded on demand without wait"""
+        with self.lock:
+            self.warming.update(
+                word_list["filename"]
+                for word_list in word_lists
+                if word_list["filename"] not in self.word_lists
+            )
+
+    def reload(self):
+        """Loads the lists whose files changed since they were loaded again
+        and swaps them in. Lists are loaded without holding the lock, so other lists
+        can be used meanwhile, and games keep the lists they started with.
+        Returns the names of the reloaded lists"""
+        with self.lock:
+            versions = list(self.versions.values())
+        reloaded = []
+        for word_list, version in versions:
+            try:
+                new_version = _get_version(word_list)
+                if new_version == version:
+                    continue
+                loaded = self._load(word_list)
+            except OSError as ex:
+                print(f"word_lists.py: Couldn't reload {word_list['name']}: {ex}")
+                continue
+            self.put(word_list, loaded, new_version)
+            reloaded.append(word_list["name"])
+        return reloaded
+
+    def put(self, word_list, loaded, version=None):
+        """Swaps in a loaded list for an entry, replacing the one loaded before"""
+        with self.lock:
+            self._put(word_list, loaded, version or _get_version(word_list))
+
+    def _put(self, word_list, loaded, version):
+        key = word_list["filename"]
+        self.word_lists[key] = loaded
+        self.word_lists.move_to_end(key)
+        self.versions[key] = (word_list, version)
+        print(f"word_lists.py: Loaded word list {loaded.name} ({len(loaded)} words)")
+        self._evict()
+
+    @staticmethod
+    def _load(word_list):
+        """Loads a word list from the newest of its files"""
+        name = word_list["name"]
+        filename = _get_source(word_list)
+        if filename.endswith(".dawg"):
+            return GraphWordList(name, filename)
+        if filename.endswith(".bin"):
+            return MappedWordList(name, filename)
+        return WordList.from_file(name, filename)
+
+    def _evict(self):
+        """Unloads least recently used lists until the cache fits its size limit.
+        The most recently used list is always kept. Games still holding an evicted
+        list keep using it until they end"""
+        if self.max_words is None:
+            return
+        while len(self.word_lists) > 1 and self.size() > self.max_words:
+            key, loaded = self.word_lists.popitem(last=False)
+            del self.versions[key]
+            print(f"word_lists.py: Unloaded word list {loaded.name}")
+
+    def size(self):
+        """Total number of words currently loaded"""
+        return sum(map(len, self.word_lists.values()))
+
+
+def _is_eligible_word(word, letters):
+    """Checks if a word is valid to be loaded in
+    (only letters, lowercase or titlecase)"""
+    return all(letter in letters for letter in word.lower()) and word[1:].islower()
+
+
+def _find_eligible(words, masks, letters):
+    """Returns the indexes of the eligible words of one length (see _is_eligible_word).
+    Words are lowercase, so with an alphabet of lowercase letters that all have their
+    own bit, a word is eligible if its mask fits the alphabet and it's not one letter"""
+    if letter_masks.alphabet_mask(letters) & letter_masks.OTHER or not all(
+        map(str.islower, letters)
+    ):
+        return [i for i in range(len(words)) if _is_eligible_word(words[i], letters)]
+    if not len(words) or len(words[0]) < 2:
+        return []
+    return np.flatnonzero(letter_masks.fits_alphabet(masks, letters)).tolist()
+
+
+def get_compiled_filename(filename):
+    """Returns the filename of the compiled version of a word list file"""
+    return os.path.splitext(filename)[0] + ".bin"
+
+
+def get_graph_filename(filename):
+    """Returns the filename of the word graph of a word list file"""
+    return os.path.splitext(filename)[0] + ".dawg"
+
+
+def _get_source(word_list):
+    """Returns the file a word list entry is loaded from:
+    its word graph or compiled list if they are up to date, else its text file"""
+    filename = WORD_LIST_DIR + word_list["filename"]
+    for compiled_filename in (
+        get_graph_filename(filename),
+        get_compiled_filename(filename),
+    ):
+        if _is_up_to_date(compiled_filename, filename):
+            return compiled_filename
+    return filename
+
+
+def _get_version(word_list):
+    """Returns what changes when a word list entry's file is replaced or edited"""
+    filename = _get_source(word_list)
+    stat = os.stat(filename)
+    return filename, stat.st_mtime_ns, stat.st_size
+
+
+def _is_up_to_date(compiled_filename, filename):
+    """Checks if a compiled word list exists and is newer than its source"""
+    if not os.path.exists(compiled_filename):
+        return False
+    if not os.path.exists(filename):
+        return True
+    return os.path.getmtime(compiled_filename) >= os.path.getmtime(filename)
+
+
+def compile_word_list(filename):
+    """Compiles a word list text file into the memory-mappable format"""
+    partitions = collections.defaultdict(set)
+    with open(filename, encoding="UTF-8") as file:
+        for word in read_words(file):
+            partitions[len(word)].add(word.encode("UTF-8"))
+
+    lengths = sorted(partitions)
+    position = HEADER.size + len(lengths) * PARTITION.size
+    table = []
+    blocks = []
+    for length in lengths:
+        words = sorted(partitions[length])
+        offsets = array.array("I", [0])
+        for word in words:
+            offsets.append(offsets[-1] + len(word))
+        data = b"".join(words)
+        offsets_pos = position
+        data_pos = offsets_pos + len(offsets) * 4
+        # Keep the next offsets table 4-byte aligned
+        padding = -(data_pos + len(data)) % 4
+        position = data_pos + len(data) + padding
+        table.append(PARTITION.pack(length, len(words), offsets_pos, data_pos))
+        blocks += [offsets.tobytes(), data, bytes(padding)]
+
+    with open(get_compiled_filename(filename), "wb") as file:
+        file.write(HEADER.pack(BINARY_MAGIC, BINARY_BYTE_ORDER, len(lengths)))
+        file.writelines(table)
+        file.writelines(blocks)
+
+
+def compile_word_graph(filename):
+    """Compiles a word list text file into a memory-mappable word graph"""
+    with open(filename, encoding="UTF-8") as file:
+        graph = dawg.Dawg.from_words(read_words(file))
+    graph.save(get_graph_filename(filename))
+
+
+def normalize_word(text):
+    """Returns a word lowercase and in the same Unicode form as the words of all
+    word lists (so "ä" typed as "a" + umlaut matches "ä")"""
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def read_words(lines):
+    """Yields the words of lines of text one at a time, normalized with
+    normalize_word. Empty lines are skipped"""
+    for line in lines:
+        word = normalize_word(line.strip())
+        if word:
+            yield word
+
+
+# Load optional settings from config
+if hasattr(config, "WORD_LIST_CACHE_SIZE"):
+    WORD_LIST_CACHE_SIZE = config.WORD_LIST_CACHE_SIZE
+if hasattr(config, "WORD_LIST_WATCH_INTERVAL"):
+    WORD_LIST_WATCH_INTERVAL = config.WORD_LIST_WATCH_INTERVAL
+
+cache = WordListCache(WORD_LIST_CACHE_SIZE)
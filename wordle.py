@@ -2,9 +2,22 @@
 
 import collections
 import random
+import runpy
+import weakref
 
 import config
-from wordle_guess import LetterGuess, Guess
+import custom_lists
+import daily
+import letter_masks
+import scoring
+import word_lists
+from wordle_guess import (
+    LetterGuess,
+    Guess,
+    PackedGuesses,
+    pack_pattern,
+    solved_pattern,
+)
 
 WORD_LISTS = {
     "Substantive": {
@@ -53,15 +66,27 @@ WORD_LISTS = {
 
 LETTERS = {
     "German": {
+        "name": "German",
         "letters": "abcdefghijklmnopqrstuvwxyzäöüß",
         "description": "Normales deutsches Alphabet",
     },
     "English": {
+        "name": "English",
         "letters": "abcdefghijklmnopqrstuvwxyz",
         "description": "Standard English alphabet",
     },
 }
 
+# Game modes by name (lowercase)
+MODES = {
+    "random": "random",
+    "zufall": "random",
+    "daily": "daily",
+    "täglich": "daily",
+}
+
+MAX_BOARDS = 8
+
 DEFAULT_WORD_LIST = "Wordle"
 DEFAULT_GUESS_LIST = "Wordle-all"
 DEFAULT_ALPHABET = "English"
@@ -72,6 +97,18 @@ DEFAULT_MAX_LENGTH = 6
 class WordleState:
     """State including settings and the current wordle game"""
 
+    __slots__ = (
+        "word_list",
+        "guess_list",
+        "valid_letters",
+        "min_length",
+        "max_length",
+        "daily",
+        "boards",
+        "guild",
+        "game",
+    )
+
     def __init__(self):
         # Some default values
         self.word_list = WORD_LISTS[
@@ -83,35 +120,120 @@ class WordleState:
         self.valid_letters = LETTERS[DEFAULT_ALPHABET]
         self.min_length = DEFAULT_MIN_LENGTH
         self.max_length = DEFAULT_MAX_LENGTH
+        self.daily = False  # Play the daily word instead of random ones
+        self.boards = 1  # Number of words guessed at the same time
+        self.guild = None  # ID of the server with the channel, for its custom lists
         self.game = None
 
     def create_game(self):
         """Creates a new game"""
-        word = self._get_new_word()
-        self.game = WordleGame(
-            word,
-            set(self.valid_letters["letters"]),
-            self.guess_list["words"] + self.word_list["words"],
-        )
+        word_list = _load_word_list(self.word_list, NoWordsException)
+        guess_list = _load_word_list(self.guess_list, NoWordsException)
+        if self.daily:
+            words = self._get_daily_words(word_list)
+        else:
+            words = self._get_new_words(word_list)
+        if self.boards > 1:
+            self.game = MultiWordleGame(
+                words,
+                self.valid_letters["letters"],
+                get_valid_words(guess_list, word_list),
+            )
+        else:
+            self.game = WordleGame(
+                words[0],
+                self.valid_letters["letters"],
+                get_valid_words(guess_list, word_list),
+            )
 
-    def _get_new_word(self):
+    def to_dict(self):
+        """Returns settings and game as a compact dict that can be stored as JSON"""
+        return {
+            "w": self.word_list["name"],
+            "g": self.guess_list["name"],
+            "a": self.valid_letters["name"],
+            "l": [self.min_length, self.max_length],
+            "d": self.daily,
+            "b": self.boards,
+            "s": self.guild,
+            "game": self.game.to_dict() if self.game else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restores a state stored with to_dict"""
+        state = cls()
+        state.guild = data.get("s")
+        available = get_word_lists(state.guild)
+        state.word_list = available.get(data["w"], state.word_list)
+        state.guess_list = available.get(data["g"], state.guess_list)
+        state.valid_letters = LETTERS.get(data["a"], state.valid_letters)
+        state.min_length, state.max_length = data["l"]
+        state.daily = data.get("d", False)
+        state.boards = data.get("b", 1)
+        if data["game"]:
+            game_class = MultiWordleGame if "words" in data["game"] else WordleGame
+            try:
+                state.game = game_class.from_dict(data["game"], state)
+            except NoWordsException:
+                pass  # The game's word lists are gone, start over with a new game
+        return state
+
+    def _get_new_word(self, word_list):
         """Creates a new random word to be guessed"""
-        valid_words = list(filter(self._is_valid_word, self.word_list["words"]))
-        if len(valid_words) == 0:
+        buckets = word_list.get_buckets(self.valid_letters["letters"])
+        lengths = range(self.min_length, self.max_length + 1)
+        total = sum(len(buckets.get(length, ())) for length in lengths)
+        if total == 0:
             raise NoWordsException(
                 "There are no words to choose! Change the word list or length requirements!"
             )
-        return random.choice(valid_words).lower()
+        # Weighted pick across the length buckets, uniform over all eligible words
+        index = random.randrange(total)
+        for length in lengths:
+            bucket = buckets.get(length, ())
+            if index < len(bucket):
+                return bucket[index]
+            index -= len(bucket)
+
+    def _get_new_words(self, word_list):
+        """Creates new random words of the same length, one for each board"""
+        words = [self._get_new_word(word_list)]
+        bucket = word_list.get_buckets(self.valid_letters["letters"])[len(words[0])]
+        if len(bucket) < self.boards:
+            raise NoWordsException(
+                f"There aren't enough words for {self.boards} boards! Change the word list or length requirements!"
+            )
+        while len(words) < self.boards:
+            word = bucket[random.randrange(len(bucket))]
+            if word not in words:
+                words.append(word)
+        return words
+
+    def _get_daily_words(self, word_list):
+        """Returns today's words for the settings"""
+        schedule = daily.get_schedule(
+            word_list, self.valid_letters["letters"], self.min_length, self.max_length
+        )
+        if schedule is None:
+            raise NoWordsException(
+                "There are no words to choose! Change the word list or length requirements!"
+            )
+        words = schedule.words(daily.today(), self.boards)
+        if words is None:
+            raise NoWordsException(
+                f"There aren't enough words for {self.boards} boards! Change the word list or length requirements!"
+            )
+        return words
 
-    def _is_valid_word(self, word):
-        """Checks if a word is valid to be loaded in
-        (correct length, only letters, lowercase or titlecase)"""
+    def is_daily_word_solved(self):
+        """Checks if today's words have already been found"""
         return (
-            self.max_length >= len(word) >= self.min_length
-            and all(
-                [letter.lower() in self.valid_letters["letters"] for letter in word]
-            )
-            and word[1:].islower()
+            self.daily
+            and self.game is not None
+            and self.game.won
+            and self.game.words
+            == self._get_daily_words(_load_word_list(self.word_list, NoWordsException))
         )
 
     def set_length(self, min_length, max_length):
@@ -129,19 +251,41 @@ class WordleState:
 
     def set_word_list(self, new_word_list):
         """Sets list from which new words will be generated"""
-        if new_word_list.lower() not in map(str.lower, WORD_LISTS):
+        available = get_word_lists(self.guild)
+        if new_word_list.lower() not in map(str.lower, available):
             raise InvalidSettingsException(
-                f"{new_word_list} is not a valid word list. Available word lists: {', '.join(WORD_LISTS)}"
+                f"{new_word_list} is not a valid word list. Available word lists: {', '.join(available)}"
             )
-        self.word_list = WORD_LISTS[new_word_list.title()]
+        word_list = _find_by_name(available, new_word_list)
+        _load_word_list(word_list, InvalidSettingsException)
+        self.word_list = word_list
 
     def set_guess_list(self, new_guess_list):
         """Sets list for words that can be guessed"""
-        if new_guess_list.lower() not in map(str.lower, WORD_LISTS):
+        available = get_word_lists(self.guild)
+        if new_guess_list.lower() not in map(str.lower, available):
             raise InvalidSettingsException(
-                f"{new_guess_list} is not a valid word list. Available word lists: {', '.join(WORD_LISTS)}"
+                f"{new_guess_list} is not a valid word list. Available word lists: {', '.join(available)}"
             )
-        self.guess_list = WORD_LISTS[new_guess_list.title()]
+        guess_list = _find_by_name(available, new_guess_list)
+        _load_word_list(guess_list, InvalidSettingsException)
+        self.guess_list = guess_list
+
+    def set_boards(self, boards):
+        """Sets the number of words guessed at the same time"""
+        if not 1 <= boards <= MAX_BOARDS:
+            raise InvalidSettingsException(
+                f"Number of boards must be between 1 and {MAX_BOARDS}!"
+            )
+        self.boards = boards
+
+    def set_mode(self, new_mode):
+        """Switches between random words and the daily word"""
+        if new_mode.lower() not in MODES:
+            raise InvalidSettingsException(
+                f"{new_mode} is not a valid mode. Available modes: {', '.join(sorted(set(MODES.values())))}"
+            )
+        self.daily = MODES[new_mode.lower()] == "daily"
 
     def set_alphabet(self, new_letters):
         """Sets alphabet from which words can be guessed"""
@@ -149,7 +293,88 @@ class WordleState:
             raise InvalidSettingsException(
                 f"{new_letters} is not a valid alphabet. Available alphabets: {', '.join(LETTERS)}"
             )
-        self.valid_letters = LETTERS[new_letters.title()]
+        self.valid_letters = _find_by_name(LETTERS, new_letters)
+
+
+def get_word_lists(guild_id=None):
+    """Returns the word lists that can be used in a server by name,
+    including its custom lists"""
+    guild_lists = custom_lists.get_lists(guild_id)
+    if guild_lists:
+        return {**WORD_LISTS, **guild_lists}
+    return WORD_LISTS
+
+
+def reload_word_lists():
+    """Adds the word list entries that are new in config.py and saved custom lists,
+    and loads word lists whose files changed again. Blocks while loading,
+    so it should run in a worker. Returns the names of the reloaded lists"""
+    global WORD_LISTS
+    if hasattr(config, "__file__"):
+        # Read config.py again without replacing the settings already in use
+        WORD_LISTS = {
+            **WORD_LISTS,
+            **runpy.run_path(config.__file__).get("WORD_LISTS", {}),
+        }
+    custom_lists.scan()
+    return word_lists.cache.reload()
+
+
+def _find_by_name(options, name):
+    """Returns the option with the name, ignoring case"""
+    return next(
+        option
+        for option_name, option in options.items()
+        if option_name.lower() == name.lower()
+    )
+
+
+class WordSetUnion:
+    """Read-only membership view over several loaded word lists,
+    so guess validation never has to copy or concatenate them"""
+
+    __slots__ = ("word_sets", "__weakref__")
+
+    def __init__(self, *word_sets):
+        self.word_sets = word_sets
+
+    def names(self):
+        """Returns the names of the word lists in this view"""
+        return [word_set.name for word_set in self.word_sets]
+
+    def __contains__(self, word):
+        return any(word in word_set for word_set in self.word_sets)
+
+    def __bool__(self):
+        return any(self.word_sets)
+
+
+def get_valid_words(*loaded_word_lists):
+    """Returns the view over the given loaded word lists, shared by all games using them"""
+    valid_words = _valid_words_views.get(loaded_word_lists)
+    if valid_words is None:
+        valid_words = WordSetUnion(*loaded_word_lists)
+        _valid_words_views[loaded_word_lists] = valid_words
+    return valid_words
+
+
+# Shared guess validation views, only kept while games use them
+_valid_words_views = weakref.WeakValueDictionary()
+
+
+def _load_word_list(word_list, exception_type, wait=False):
+    """Returns the loaded word list, raises exception_type if it can't be loaded,
+    or without wait if it's still being loaded (e.g. while warming up after startup)"""
+    try:
+        return word_lists.cache.get(word_list, wait)
+    except word_lists.StillLoadingException as ex:
+        raise exception_type(
+            f"Word list {word_list['name']} is still warming up, try again in a few seconds!"
+        ) from ex
+    except OSError as ex:
+        raise exception_type(
+            f"Word list {word_list['name']} is not available right now!"
+        ) from ex
 
 
 class InvalidGuessException(Exception):
@@ -167,47 +392,81 @@ class NoWordsException(Exception):
 class WordleGame:
     """Handles a single game, each new word to be guessed is a new game"""
 
+    __slots__ = (
+        "word",
+        "valid_words",
+        "valid_letters",
+        "guesses",
+        "won",
+        "__weakref__",
+    )
+
     def __init__(self, word, valid_letters, valid_words):
         assert len(word) > 0
         self.word = word
         self.valid_words = valid_words
         self.valid_letters = valid_letters
-        self.guessed_letters = set()
-        self.guesses = []
+        self.guesses = PackedGuesses(len(word))
         self.won = False
 
+    @property
+    def words(self):
+        """The word to be guessed in a list, like MultiWordleGame.words"""
+        return [self.word]
+
+    @property
+    def guessed_letters(self):
+        """Set of all letters that have been guessed"""
+        return set(self.guesses.words)
+
     def guess(self, guess):
         """Takes guess input, handles it, returns whether it's right and analysis of letters"""
         if self.won:
             raise InvalidGuessException("Start a new game before guessing!")
         self._check_valid_guess(guess)
-        self.guessed_letters.update(guess)
+        self._add_guess(guess)
+        return self.won
+
+    def _add_guess(self, guess):
+        """Stores the analysis of a guess"""
         result = self._analyze_guess(guess)
-        self.guesses.append(result)
+        self.guesses.append(guess, pack_pattern(result))
         self.won = set(lg.guess for lg in result) == {Guess.CORRECT}
-        return self.won
+
+    def to_dict(self):
+        """Returns the game as a compact dict, guesses are stored as words only"""
+        return {
+            "word": self.word,
+            "letters": "".join(sorted(self.valid_letters)),
+            "lists": self.valid_words.names(),
+            "guesses": [self.guesses.word(i) for i in range(len(self.guesses))],
+        }
+
+    @classmethod
+    def from_dict(cls, data, state):
+        """Restores a game stored with to_dict, see restore_game"""
+        return restore_game(cls, data["word"], data, state)
 
     def get_letters_not_tried(self):
-        return "".join(sorted(self.valid_letters - self.guessed_letters))
+        return get_letters_not_tried(self.valid_letters, self.guesses.words)
 
     def get_letters_definitely_in(self):
-        return "".join(sorted(self.guessed_letters & set(self.word)))
+        guessed = letter_masks.word_mask(self.guesses.words)
+        word = letter_masks.word_mask(self.word)
+        if (guessed | word) & letter_masks.OTHER:
+            return "".join(sorted(self.guessed_letters & set(self.word)))
+        return letter_masks.get_letters(guessed & word)
 
     def get_letters_definitely_out(self):
-        return "".join(sorted(self.guessed_letters - set(self.word)))
+        guessed = letter_masks.word_mask(self.guesses.words)
+        word = letter_masks.word_mask(self.word)
+        if (guessed | word) & letter_masks.OTHER:
+            return "".join(sorted(self.guessed_letters - set(self.word)))
+        return letter_masks.get_letters(guessed & ~word)
 
     def _check_valid_guess(self, guess):
         """Checks if a word is valid to be guessed, raises an exception if not"""
-        if guess == self.word:
-            return
-        if len(guess) != len(self.word):
-            raise InvalidGuessException(
-                f"Guess needs to be {len(self.word)} letters long!"
-            )
-        if not set(guess).issubset(self.valid_letters):
-            raise InvalidGuessException(f"{guess!r} contains invalid characters!")
-        if self.valid_words and guess not in self.valid_words:
-            raise InvalidGuessException(f"{guess!r} is not a valid word!")
+        check_valid_guess(guess, self.words, self.valid_letters, self.valid_words)
 
     def _analyze_guess(self, guess):
         """Returns which of the letters in the guess are correct,
@@ -232,21 +491,129 @@ class WordleGame:
         return result
 
 
-def load_lines(filename):
-    """Loads lines from a file into list"""
-    with open(filename, encoding="UTF-8") as file:
-        lines = file.read().splitlines()
-    return lines
+class MultiWordleGame:
+    """Several words of the same length guessed at the same time, each on its own
+    board. Every guess is checked once and scored against all unsolved boards at once,
+    solved boards don't get any more guesses"""
+
+    __slots__ = (
+        "words",
+        "valid_words",
+        "valid_letters",
+        "boards",
+        "encoded_words",
+        "guessed_words",
+        "won",
+        "__weakref__",
+    )
 
+    def __init__(self, words, valid_letters, valid_words):
+        assert len(words) > 0 and len(set(map(len, words))) == 1
+        self.words = words
+        self.valid_words = valid_words
+        self.valid_letters = valid_letters
+        self.boards = [PackedGuesses(len(words[0])) for _ in words]
+        self.encoded_words = scoring.encode_words(words, valid_letters)
+        self.guessed_words = []
+        self.won = False
+
+    @property
+    def guessed_letters(self):
+        """Set of all letters that have been guessed"""
+        return set("".join(self.guessed_words))
+
+    def is_solved(self, board):
+        """Checks if the word of a board has been found"""
+        guesses = self.boards[board]
+        return bool(len(guesses)) and guesses.patterns[-1] == solved_pattern(
+            guesses.length
+        )
+
+    def guess(self, guess):
+        """Takes guess input, handles it, returns whether all words have been found"""
+        if self.won:
+            raise InvalidGuessException("Start a new game before guessing!")
+        check_valid_guess(guess, self.words, self.valid_letters, self.valid_words)
+        self._add_guess(guess)
+        return self.won
+
+    def _add_guess(self, guess):
+        """Scores a guess against the words of all unsolved boards"""
+        unsolved = [i for i in range(len(self.words)) if not self.is_solved(i)]
+        patterns = scoring.score(
+            scoring.encode_words([guess], self.valid_letters)[0],
+            self.encoded_words[unsolved],
+        )
+        for board, pattern in zip(unsolved, patterns.tolist()):
+            self.boards[board].append(guess, pattern)
+        self.guessed_words.append(guess)
+        self.won = all(self.is_solved(i) for i in range(len(self.words)))
+
+    def to_dict(self):
+        """Returns the game as a compact dict, guesses are stored as words only"""
+        return {
+            "words": self.words,
+            "letters": "".join(sorted(self.valid_letters)),
+            "lists": self.valid_words.names(),
+            "guesses": self.guessed_words,
+        }
+
+    @classmethod
+    def from_dict(cls, data, state):
+        """Restores a game stored with to_dict, see restore_game"""
+        return restore_game(cls, data["words"], data, state)
+
+    def get_letters_not_tried(self):
+        return get_letters_not_tried(self.valid_letters, "".join(self.guessed_words))
+
+
+def get_letters_not_tried(valid_letters, guessed):
+    """Returns the letters of an alphabet that aren't in the guessed text, sorted"""
+    alphabet = letter_masks.alphabet_mask(valid_letters)
+    guessed_mask = letter_masks.word_mask(guessed)
+    if (alphabet | guessed_mask) & letter_masks.OTHER:
+        return "".join(sorted(set(valid_letters) - set(guessed)))
+    return letter_masks.get_letters(alphabet & ~guessed_mask)
+
+
+def restore_game(game_class, words, data, state):
+    """Restores a game stored with to_dict, made with words (the word or the words
+    of the game), replaying its guesses. Word lists that can't be loaded anymore
+    are replaced by the state's lists"""
+    try:
+        valid_words = get_valid_words(
+            *(
+                word_lists.cache.get(get_word_lists(state.guild)[name])
+                for name in data["lists"]
+            )
+        )
+    except (KeyError, OSError):
+        valid_words = get_valid_words(
+            _load_word_list(state.guess_list, NoWordsException, wait=True),
+            _load_word_list(state.word_list, NoWordsException, wait=True),
+        )
+    game = game_class(words, data["letters"], valid_words)
+    for guess in data["guesses"]:
+        game._add_guess(guess)  # pylint: disable=protected-access
+    return game
+
+
+def check_valid_guess(guess, words, valid_letters, valid_words):
+    """Checks if a word is valid to be guessed in a game with some words,
+    raises an exception if not"""
+    if guess in words:
+        return
+    if len(guess) != len(words[0]):
+        raise InvalidGuessException(f"Guess needs to be {len(words[0])} letters long!")
+    if not letter_masks.has_only(guess, valid_letters):
+        raise InvalidGuessException(f"{guess!r} contains invalid characters!")
+    if valid_words and guess not in valid_words:
+        raise InvalidGuessException(f"{guess!r} is not a valid word!")
 
-# Load all lists when this file is loaded
-for word_list in WORD_LISTS.values():
-    word_list["words"] = list(
-        map(str.lower, load_lines("wordLists/" + word_list["filename"]))
-    )
-print("wordle.py: All word lists loaded")
 
 # Load optional defaults from config
+if hasattr(config, "WORD_LISTS"):
+    WORD_LISTS = {**WORD_LISTS, **config.WORD_LISTS}
 if hasattr(config, "DEFAULT_WORD_LIST"):
     DEFAULT_WORD_LIST = config.DEFAULT_WORD_LIST
 if hasattr(config, "DEFAULT_GUESS_LIST"):
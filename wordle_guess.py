@@ -1,3 +1,4 @@
+from array import array
 from dataclasses import dataclass
 from enum import Enum, auto
 
@@ -14,3 +15,78 @@ class Guess(Enum):
 class LetterGuess:
     letter: str
     guess: Guess
+
+
+# Digit of each kind of feedback in a packed pattern
+PATTERN_DIGITS = {Guess.INCORRECT: 0, Guess.WRONG_POSITION: 1, Guess.CORRECT: 2}
+DIGIT_GUESSES = {digit: guess for guess, digit in PATTERN_DIGITS.items()}
+
+
+def pack_pattern(result):
+    """Packs the feedback of a guess into an int, one base 3 digit per letter,
+    the first letter being the least significant digit"""
+    pattern = 0
+    for letter_guess in reversed(result):
+        pattern = pattern * 3 + PATTERN_DIGITS[letter_guess.guess]
+    return pattern
+
+
+def unpack_pattern(word, pattern):
+    """Returns the feedback of a packed pattern as LetterGuesses"""
+    result = []
+    for letter in word:
+        pattern, digit = divmod(pattern, 3)
+        result.append(_get_letter_guess(letter, DIGIT_GUESSES[digit]))
+    return result
+
+
+def solved_pattern(length):
+    """Returns the packed pattern of a guess with all letters correct"""
+    return 3**length - 1
+
+
+def _get_letter_guess(letter, guess):
+    """Returns a shared LetterGuess instance"""
+    key = (letter, guess)
+    if key not in _letter_guesses:
+        _letter_guesses[key] = LetterGuess(letter, guess)
+    return _letter_guesses[key]
+
+
+_letter_guesses = {}
+
+
+class PackedGuesses:
+    """Compact storage for the guesses of a game: the guessed words concatenated
+    into one string and one packed pattern per guess. Indexing returns the rows
+    as lists of LetterGuess"""
+
+    __slots__ = ("length", "words", "patterns")
+
+    def __init__(self, length):
+        self.length = length
+        self.words = ""
+        self.patterns = array("I")
+
+    def append(self, word, pattern):
+        self.words += word
+        self.patterns.append(pattern)
+
+    def word(self, index):
+        """Returns the guessed word of a row"""
+        return self.words[index * self.length : (index + 1) * self.length]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("guess index out of range")
+        return unpack_pattern(self.word(index), self.patterns[index])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
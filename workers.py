@@ -0,0 +1,97 @@
+"""Runs CPU-bound work (new words, guesses, rendering) off the event loop"""
+
+import asyncio
+import concurrent.futures
+import weakref
+
+import config
+
+# Maximum number of messages being handled at the same time
+MAX_WORKERS = 4
+
+# Seconds between printing worker pool statistics (None to never print them)
+WORKER_STATS_INTERVAL = None
+
+
+class WorkerPool:
+    """Bounded thread pool for blocking work, keeping track of its queue depth"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="wortlerino-worker"
+        )
+        self.slots = None
+        self.stats_task = None
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+
+    async def run(self, func, *args):
+        """Runs func(*args) in the pool and returns its result,
+        waiting for a free worker if all of them are busy"""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_workers)
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.slots.release()
+
+    def stats(self):
+        """Returns current queue depth and counters"""
+        return {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+        }
+
+    def start_printing_stats(self, interval):
+        """Prints statistics every interval seconds from now on"""
+        if self.stats_task is None:
+            self.stats_task = asyncio.get_running_loop().create_task(
+                self._print_stats(interval)
+            )
+
+    async def _print_stats(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print("workers.py:", self.stats())
+
+
+class ChannelLocks:
+    """One asyncio lock per channel, so each channel's messages are handled in order.
+    Locks only live as long as someone is waiting for or holding them"""
+
+    def __init__(self):
+        self.locks = weakref.WeakValueDictionary()
+
+    def get(self, channel):
+        """Returns the lock for a channel"""
+        lock = self.locks.get(channel)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.locks[channel] = lock
+        return lock
+
+
+# Load optional settings from config
+if hasattr(config, "MAX_WORKERS"):
+    MAX_WORKERS = config.MAX_WORKERS
+if hasattr(config, "WORKER_STATS_INTERVAL"):
+    WORKER_STATS_INTERVAL = config.WORKER_STATS_INTERVAL
+
+pool = WorkerPool(MAX_WORKERS)
+channel_locks = ChannelLocks()
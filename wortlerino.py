@@ -1,13 +1,32 @@
 """Wordle-Bot for discord"""
 
+import asyncio
+import io
+import weakref
+
+import custom_lists
+import daily
 import discord
-from image_guesses import get_image_from_guesses
+import game_stats
+import image_guesses
+from image_guesses import BoardRenderer, MultiBoardRenderer, get_text_from_guesses
 import wordle
+from wordle_guess import Guess
+import metrics
+import sending
+import solver
+import word_lists
+import workers
+import warmup
 import config
+import state_store
 
 # Discord stuff
-client = discord.Client()
-TOKEN = config.TOKEN
+if hasattr(config, "SHARD_ID"):
+    # Started by shards.py, this process only connects as one of the shards
+    client = discord.Client(shard_id=config.SHARD_ID, shard_count=config.SHARD_COUNT)
+else:
+    client = discord.Client()
 
 # Constants
 VERSION = 1.2
@@ -16,249 +35,683 @@ YELLOW = "🟨"
 GREEN = "🟩"
 BLACK = "⬜"
 
+TEXT_SQUARES = {
+    Guess.CORRECT: GREEN,
+    Guess.WRONG_POSITION: YELLOW,
+    Guess.INCORRECT: BLACK,
+}
+
+# Boards are sent as text instead of images while this many messages are waiting
+# for a worker (0 to always send text, None to always send images)
+TEXT_BOARD_QUEUE_DEPTH = 20
+if hasattr(config, "TEXT_BOARD_QUEUE_DEPTH"):
+    TEXT_BOARD_QUEUE_DEPTH = config.TEXT_BOARD_QUEUE_DEPTH
+
+# User IDs of the people who can reload word lists
+ADMIN_IDS = []
+if hasattr(config, "ADMIN_IDS"):
+    ADMIN_IDS = config.ADMIN_IDS
+
 COLOR_CORRECT = 0x538D4E
 COLOR_STANDARD = 0x8D7D4E
 COLOR_ERROR = 0x8D4E4E
 
 WIKILINK = "https://XX.wikipedia.org/wiki/"
 
-COMMANDS = [
-    "wort",
-    "word",
-    "wortle",
-    "wordle",
-    "wortlerino",
-    "wordlerino",
-    "w",
-    "neu",
-    "new",
-    "nochmal",
-    "again",
-    "next",
-    "guess",
-    "n",
-    "set",
-]
-
-# Stores all wordle states (one per channel)
-wordle_states = {}
+COMMANDS = frozenset(
+    [
+        "wort",
+        "word",
+        "wortle",
+        "wordle",
+        "wortlerino",
+        "wordlerino",
+        "w",
+        "neu",
+        "new",
+        "nochmal",
+        "again",
+        "next",
+        "guess",
+        "n",
+        "set",
+    ]
+)
+
+HINT_COMMANDS = frozenset(["hint", "tipp"])
+
+REMAINING_COMMANDS = frozenset(["remaining", "left", "übrig"])
+
+RELOAD_COMMANDS = frozenset(["reload"])
+
+UPLOAD_COMMANDS = frozenset(["upload", "hochladen"])
+
+STATS_COMMANDS = frozenset(["stats", "statistik", "leaderboard"])
+
+# Arguments of the stats command to show the author's own statistics
+OWN_STATS_ARGS = frozenset(["me", "ich"])
+
+# Commands that are only recognized without anything after them,
+# or with one of these words after them
+KEYWORD_COMMANDS = {
+    **dict.fromkeys(HINT_COMMANDS | REMAINING_COMMANDS | RELOAD_COMMANDS, frozenset()),
+    **dict.fromkeys(STATS_COMMANDS, OWN_STATS_ARGS),
+}
+
+WORD_LIST_SETTINGS = frozenset(
+    ["wordlist", "word_list", "words", "wl", "w", "worte", "wörter"]
+)
+
+GUESS_LIST_SETTINGS = frozenset(
+    ["guesslist", "guess_list", "guess", "guesses", "gl", "g"]
+)
+
+ALPHABET_SETTINGS = frozenset(["alphabet", "letters", "buchstaben", "characters"])
+
+LENGTH_SETTINGS = frozenset(["length", "size", "länge", "l"])
+
+MODE_SETTINGS = frozenset(["mode", "modus"])
+
+BOARD_SETTINGS = frozenset(["boards", "bretter", "b"])
+
+# Stores all wordle states (one per channel ID)
+wordle_states = state_store.states
+
+metrics.Gauge(
+    "wortlerino_worker_queue_depth",
+    "Messages waiting for a free worker",
+    lambda: workers.pool.queued,
+)
+metrics.Gauge(
+    "wortlerino_workers_busy",
+    "Workers handling a message",
+    lambda: workers.pool.running,
+)
+metrics.Gauge(
+    "wortlerino_sends_pending",
+    "Messages waiting to be sent",
+    lambda: sending.scheduler.pending,
+)
+metrics.Gauge(
+    "wortlerino_states_in_memory",
+    "Channel states kept in memory",
+    lambda: len(wordle_states.states),
+)
+metrics.Gauge(
+    "wortlerino_image_cache_bytes",
+    "Bytes of the board images kept in memory",
+    lambda: image_guesses.image_cache.size,
+)
+metrics.Gauge(
+    "wortlerino_warming_up",
+    "1 while word lists are loaded in the background after starting",
+    lambda: int(not warmup.warmup.ready.is_set()),
+)
+metrics.Gauge(
+    "wortlerino_stats_in_memory",
+    "Statistics of channels and players kept in memory",
+    lambda: len(game_stats.stats.totals),
+)
+
+# Stores the renderer of each running game
+board_renderers = weakref.WeakKeyDictionary()
+
+
+def get_command(message):
+    """Returns the lowercase first word of a message if it's meant for this bot, else None.
+    Keyword commands like hint are ordinary words, so they're only meant for the bot
+    when they're the whole message"""
+    split_message = message.content.lower().split()
+    if not split_message:
+        return None
+    command = split_message[0]
+    if command in KEYWORD_COMMANDS and (
+        len(split_message) > 2
+        or len(split_message) == 2
+        and split_message[1] not in KEYWORD_COMMANDS[command]
+    ):
+        return None
+    if command in COMMAND_HANDLERS or command in MESSAGE_COMMAND_HANDLERS:
+        return command
+    return None
+
+
+def get_message_handler(command, message):
+    """Returns the handler of a message that needs the whole message and runs on
+    the event loop, or None if it's handled by parse_message"""
+    if command in COMMANDS:
+        args = message.content.lower().split()[1:]
+        if len(args) == 2:
+            return MESSAGE_SUBCOMMAND_HANDLERS.get(args[0])
+        return None
+    return MESSAGE_COMMAND_HANDLERS.get(command)
 
 
 def parse_message(message):
     """Parses message and returns color and text to respond with
     Will only parse messages if first word is in commands
+    Hint and remaining commands give a hint or the number of possible words for the current game
     If no further arguments are given, will try to start a new game
     If two arguments are given, second one is taken as a guess
     If three or more arguments are given, it's treated as trying  to change settings:
         word_list, guess_list, or length
         word_list and guess_list will take one argument to choose the list
-        length will take two arguments as min_length and max_length, or one argument to set both to be the same"""
-    split_message = message.content.split()
-    number_of_messages = len(split_message)
+        length will take two arguments as min_length and max_length, or one argument to set both to be the same
+    """
+    command = get_command(message)
+    if command is None:
+        return None, None, None  # Ignore this message, it's not for this bot
 
     # Chooses the channel-specific wordle state
-    if message.channel not in wordle_states:
-        wordle_states[message.channel] = wordle.WordleState()
-    wordle_state = wordle_states[message.channel]
+    wordle_state = wordle_states.get(message.channel.id)
+    if message.guild is not None:
+        wordle_state.guild = message.guild.id
+    response = COMMAND_HANDLERS[command](wordle_state, message.content.split()[1:])
+    if response[0]:
+        # The game was just won
+        game_stats.stats.record(
+            wordle_state.guild,
+            message.channel.id,
+            message.author.id if message.author is not None else None,
+            wordle_state.game,
+            wordle_state.daily,
+        )
+    return response
 
-    # Parse message based on number of words in it
-    if number_of_messages == 0 or split_message[0].lower() not in COMMANDS:
-        return None, None, None  # Ignore this message, it's not for this bot
-    if number_of_messages == 1:
-        # Make a new game (if one isn't already in progress)
-        if not wordle_state.game or wordle_state.game.won:
-            try:
-                wordle_state.create_game()
-                print("new game:", wordle_state.game.word)
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"New game started! (Word has {len(wordle_state.game.word)} letters and is from word list {wordle_state.word_list['name']})",
-                )
-            except wordle.NoWordsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        else:
-            return False, COLOR_ERROR, "There's already a game in progress!"
-
-    elif number_of_messages == 2:
-        # Take a guess
-        guess = split_message[1].lower()
-        try:
-            won = wordle_state.game.guess(guess)
-            img = get_image_from_guesses(wordle_state.game.guesses)
-            file = discord.File(img, "guesses.png")
-            if won:
-                guesses = wordle_state.game.guesses
-                return (
-                    True,
-                    COLOR_CORRECT,
-                    f"\nCongrats! You guessed right after {len(guesses)} guess{'es' if len(guesses)>1 else ''}.",
-                    file,
-                )
-            else:
-                return (
-                    False,
-                    COLOR_STANDARD,
-                    f"Letters you haven't tried: {wordle_state.game.get_letters_not_tried()}",
-                    file,
-                )
-        except wordle.InvalidGuessException as ex:
-            return False, COLOR_ERROR, str(ex)
-
-    elif number_of_messages == 3:
-        # Change some settings
-        if split_message[1].lower() in [
-            "wordlist",
-            "word_list",
-            "words",
-            "wl",
-            "w",
-            "worte",
-            "wörter",
-        ]:
-            try:
-                wordle_state.set_word_list(split_message[2])
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"Word list has been changed to {split_message[2]}: {wordle.WORD_LISTS[split_message[2].title()]['description']}!",
-                )
-            except wordle.InvalidSettingsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        elif split_message[1].lower() in [
-            "guesslist",
-            "guess_list",
-            "guess",
-            "guesses",
-            "gl",
-            "g",
-        ]:
-            try:
-                wordle_state.set_guess_list(split_message[2])
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"Guess list has been changed to {split_message[2]}: {wordle.WORD_LISTS[split_message[2].title()]['description']}!",
-                )
-            except wordle.InvalidSettingsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        elif split_message[1].lower() in [
-            "alphabet",
-            "letters",
-            "buchstaben",
-            "characters",
-        ]:
-            try:
-                wordle_state.set_alphabet(split_message[2])
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"Alphabet has been changed to {split_message[2]}: {wordle.LETTERS[split_message[2].title()]['description']}!",
-                )
-            except wordle.InvalidSettingsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        elif split_message[1] in ["length", "size", "länge", "l"]:
-            new_length = split_message[2]
-            if not new_length.isnumeric():
-                return False, COLOR_ERROR, "New length must be a number!"
-            try:
-                wordle_state.set_length(int(new_length), int(new_length))
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"Length for new words has been set to {new_length}.",
-                )
-            except wordle.InvalidSettingsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        else:
+
+def play(wordle_state, args):
+    """Handles the game commands based on the number of arguments"""
+    if len(args) < len(PLAY_HANDLERS):
+        return PLAY_HANDLERS[len(args)](wordle_state, args)
+    return False, COLOR_ERROR, "Too many words!"
+
+
+def new_game(wordle_state, args):
+    """Makes a new game (if one isn't already in progress)"""
+    if wordle_state.game and not wordle_state.game.won:
+        return False, COLOR_ERROR, "There's already a game in progress!"
+    try:
+        if wordle_state.is_daily_word_solved():
             return (
                 False,
                 COLOR_ERROR,
-                "Not a valid setting. Try word_list, guess_list, or length!",
+                "You already found today's word! The next one comes at midnight (UTC).",
             )
+        with metrics.span("create_game"):
+            wordle_state.create_game()
+    except wordle.NoWordsException as ex:
+        metrics.rejections.inc(type(ex).__name__)
+        return False, COLOR_ERROR, str(ex)
+    metrics.games_created.inc()
+    words = wordle_state.game.words
+    print("new game:", ", ".join(words))
+    if len(words) > 1:
+        started = f"{'Daily game' if wordle_state.daily else 'New game'} with {len(words)} words started! (Words have"
+    elif wordle_state.daily:
+        started = f"Daily word #{daily.today()} started! (Word has"
+    else:
+        started = "New game started! (Word has"
+    return (
+        False,
+        COLOR_CORRECT,
+        f"{started} {len(words[0])} letters and {'are' if len(words) > 1 else 'is'} from word list {wordle_state.word_list['name']})",
+    )
 
-    elif number_of_messages == 4:
-        # Change settings (because length may take two arguments)
-        if split_message[1] in ["length", "size", "länge", "l"]:
-            new_min_length = split_message[2]
-            new_max_length = split_message[3]
-            if not new_min_length.isnumeric() or not new_max_length.isnumeric():
-                return False, COLOR_ERROR, "New length must be a number!"
-            try:
-                wordle_state.set_length(int(new_min_length), int(new_max_length))
-                return (
-                    False,
-                    COLOR_CORRECT,
-                    f"Length for new words has been set to {new_min_length}-{new_max_length}.",
-                )
-            except wordle.InvalidSettingsException as ex:
-                return False, COLOR_ERROR, str(ex)
-        else:
+
+def take_guess(wordle_state, args):
+    """Takes a guess"""
+    game = wordle_state.game
+    try:
+        if game is None:
+            raise wordle.InvalidGuessException("Start a new game before guessing!")
+        with metrics.span("guess"):
+            won = game.guess(word_lists.normalize_word(args[0]))
+    except wordle.InvalidGuessException as ex:
+        metrics.rejections.inc(type(ex).__name__)
+        return False, COLOR_ERROR, str(ex)
+    metrics.guesses.inc()
+
+    board, file = render_board(game)
+    if won:
+        metrics.games_won.inc()
+        guesses = (
+            game.guessed_words
+            if isinstance(game, wordle.MultiWordleGame)
+            else game.guesses
+        )
+        return (
+            True,
+            COLOR_CORRECT,
+            f"{board}\nCongrats! You guessed right after {len(guesses)} guess{'es' if len(guesses)>1 else ''}.",
+            file,
+        )
+    return (
+        False,
+        COLOR_STANDARD,
+        f"{board}Letters you haven't tried: {game.get_letters_not_tried()}",
+        file,
+    )
+
+
+def render_board(game):
+    """Returns the board as text to put before the response and as image file,
+    only one of them is used depending on the load"""
+    multi = isinstance(game, wordle.MultiWordleGame)
+    if (
+        TEXT_BOARD_QUEUE_DEPTH is not None
+        and workers.pool.queued >= TEXT_BOARD_QUEUE_DEPTH
+    ):
+        metrics.boards.inc("text")
+        if multi:
             return (
-                False,
-                COLOR_ERROR,
-                "Not a valid setting. Try word_list, guess_list, or length!",
+                "\n\n".join(
+                    get_text_from_guesses(guesses, TEXT_SQUARES)
+                    for guesses in game.boards
+                )
+                + "\n",
+                None,
             )
+        return get_text_from_guesses(game.guesses, TEXT_SQUARES) + "\n", None
+    if game not in board_renderers:
+        board_renderers[game] = MultiBoardRenderer() if multi else BoardRenderer()
+    renderer = board_renderers[game]
+    metrics.boards.inc(renderer.image_format)
+    # Channels that guess the same (like with the daily word) share their images
+    if multi:
+        key = image_guesses.get_boards_key(game.boards, renderer.image_format)
+    else:
+        key = image_guesses.get_board_key(game.guesses, renderer.image_format)
+    image = image_guesses.image_cache.get(key)
+    if image is None:
+        with metrics.span("render"):
+            image = renderer.render(game.boards if multi else game.guesses).getvalue()
+        image_guesses.image_cache.put(key, image)
+    return "", discord.File(io.BytesIO(image), renderer.filename)
+
+
+def change_setting(wordle_state, args):
+    """Changes a setting, the first argument chooses which one"""
+    handler = SETTING_HANDLERS.get(args[0].lower())
+    if handler is None or (len(args) > 2 and handler is not set_length):
+        return (
+            False,
+            COLOR_ERROR,
+            "Not a valid setting. Try word_list, guess_list, length, mode, or boards!",
+        )
+    try:
+        return handler(wordle_state, args[1:])
+    except wordle.InvalidSettingsException as ex:
+        metrics.rejections.inc(type(ex).__name__)
+        return False, COLOR_ERROR, str(ex)
+
+
+def set_word_list(wordle_state, values):
+    wordle_state.set_word_list(values[0])
+    return (
+        False,
+        COLOR_CORRECT,
+        f"Word list has been changed to {values[0]}: {wordle_state.word_list['description']}!",
+    )
+
+
+def set_guess_list(wordle_state, values):
+    wordle_state.set_guess_list(values[0])
+    return (
+        False,
+        COLOR_CORRECT,
+        f"Guess list has been changed to {values[0]}: {wordle_state.guess_list['description']}!",
+    )
+
+
+def set_alphabet(wordle_state, values):
+    wordle_state.set_alphabet(values[0])
+    return (
+        False,
+        COLOR_CORRECT,
+        f"Alphabet has been changed to {values[0]}: {wordle_state.valid_letters['description']}!",
+    )
+
+
+def set_mode(wordle_state, values):
+    wordle_state.set_mode(values[0])
+    return (
+        False,
+        COLOR_CORRECT,
+        f"Mode has been changed to {values[0]}{' (same word for everyone each day)' if wordle_state.daily else ''}!",
+    )
+
+
+def set_length(wordle_state, values):
+    """Takes one length, or a minimum and maximum length"""
+    if not all(value.isnumeric() for value in values):
+        return False, COLOR_ERROR, "New length must be a number!"
+    wordle_state.set_length(int(values[0]), int(values[-1]))
+    return (
+        False,
+        COLOR_CORRECT,
+        f"Length for new words has been set to {'-'.join(values)}.",
+    )
+
+
+def set_boards(wordle_state, values):
+    """Takes the number of words to guess at the same time"""
+    if not values[0].isnumeric():
+        return False, COLOR_ERROR, "Number of boards must be a number!"
+    wordle_state.set_boards(int(values[0]))
+    return (
+        False,
+        COLOR_CORRECT,
+        f"New games will have {values[0]} board{'s' if int(values[0]) != 1 else ''}.",
+    )
+
+
+def give_hint(wordle_state, args, only_remaining=False):
+    """Gives a hint or tells how many words are left"""
+    if not wordle_state.game or wordle_state.game.won:
+        return False, COLOR_ERROR, "Start a new game first!"
+    if isinstance(wordle_state.game, wordle.MultiWordleGame):
+        return False, COLOR_ERROR, "Hints aren't available for this game!"
+    try:
+        game_solver = solver.get_solver(wordle_state.game)
+    except wordle.NoWordsException as ex:
+        metrics.rejections.inc(type(ex).__name__)
+        return False, COLOR_ERROR, str(ex)
+    remaining = game_solver.remaining()
+    remaining_string = f"{remaining} possible word{'s' if remaining != 1 else ''} left."
+    if only_remaining or not remaining:
+        return False, COLOR_STANDARD, remaining_string
+    return (
+        False,
+        COLOR_STANDARD,
+        f"Try {game_solver.hint().upper()}! ({remaining_string})",
+    )
+
+
+def count_remaining(wordle_state, args):
+    return give_hint(wordle_state, args, only_remaining=True)
+
+
+async def reload_word_lists(message):
+    """Loads changed word lists again and picks up new ones, only for admins"""
+    if message.author is None or message.author.id not in ADMIN_IDS:
+        return None, None  # Ignore this message, it's not for this bot
+    reloaded = await workers.pool.run(wordle.reload_word_lists)
+    if not reloaded:
+        return COLOR_STANDARD, "All word lists are up to date."
+    return COLOR_CORRECT, f"Reloaded word lists: {', '.join(reloaded)}"
+
+
+async def upload_word_list(message):
+    """Adds the attached text file as custom word list of the server
+    (wortlerino upload name). The file is downloaded and read a chunk at a time,
+    off the event loop"""
+    args = message.content.split()[2:]
+    if message.guild is None:
+        return COLOR_ERROR, "Custom word lists can only be uploaded in servers!"
+    if not message.attachments:
+        return (
+            COLOR_ERROR,
+            "Attach a text file with one word per line to the message!",
+        )
+    if not message.author.guild_permissions.manage_guild:
+        return (
+            COLOR_ERROR,
+            "Only people who can manage this server can upload word lists!",
+        )
+    attachment = message.attachments[0]
+    try:
+        custom_lists.check_upload(
+            message.guild.id, args[0], attachment.size, wordle.WORD_LISTS
+        )
+        filename = await custom_lists.download(attachment, message.guild.id)
+        loaded = await workers.pool.run(
+            custom_lists.add, message.guild.id, args[0], filename
+        )
+    except custom_lists.UploadException as ex:
+        metrics.rejections.inc(type(ex).__name__)
+        return COLOR_ERROR, str(ex)
+    return (
+        COLOR_CORRECT,
+        f"Word list {args[0]} has been saved with {len(loaded)} words! Use it with: wortlerino word_list {args[0]}",
+    )
+
+
+async def show_stats(message):
+    """Shows the statistics and leaderboard of the channel, or with "me" the
+    author's statistics in this server"""
+    args = message.content.split()[1:]
+    if args and args[0].lower() in OWN_STATS_ARGS:
+        if message.author is None:
+            return None, None  # Ignore this message, it's not for this bot
+        guild_id = message.guild.id if message.guild is not None else None
+        summary = await workers.pool.run(
+            game_stats.stats.summary,
+            game_stats.player_key(guild_id, message.author.id),
+        )
+        if not summary["games"]:
+            return COLOR_STANDARD, "You haven't won any games here yet!"
+        heading = f"Statistics of <@{message.author.id}>"
     else:
-        return False, COLOR_ERROR, "Too many words!"
-    return False, COLOR_ERROR, "Are you talking to me? Something went wrong."
+        summary = await workers.pool.run(
+            game_stats.stats.summary, game_stats.channel_key(message.channel.id)
+        )
+        if not summary["games"]:
+            return COLOR_STANDARD, "No games have been won in this channel yet!"
+        heading = "Statistics of this channel"
+    return COLOR_STANDARD, format_stats(heading, summary)
 
 
-async def send_embed(channel, title, color, description, url=None, file=None):
-    """Sends an embed to the specified channel"""
+def format_stats(heading, summary):
+    """Returns the text of a stats summary with the histogram as bars of squares"""
+    lines = [
+        f"**{heading}**",
+        f"Games won: {summary['games']} ({summary['guesses'] / summary['games']:.1f} guesses on average)",
+        f"Streak: {summary['streak']} day{'s' if summary['streak'] != 1 else ''} (best: {summary['best_streak']})",
+        "",
+    ]
+    histogram = summary["histogram"]
+    shown = max(6, max(i for i, count in enumerate(histogram) if count) + 1)
+    most = max(histogram)
+    for i, count in enumerate(histogram[:shown]):
+        label = f"{i + 1}+" if i == len(histogram) - 1 else f"{i + 1}"
+        bar = GREEN * max(1, round(count / most * 10)) if count else BLACK
+        lines.append(f"`{label:>3}` {bar} {count}")
+    if summary["leaderboard"]:
+        lines.append("")
+        lines.append("**Leaderboard**")
+        for place, (user_id, wins) in enumerate(summary["leaderboard"], 1):
+            lines.append(
+                f"{place}. <@{user_id}>: {wins} game{'s' if wins != 1 else ''}"
+            )
+    return "\n".join(lines)
+
+
+async def watch_word_lists(interval):
+    """Reloads changed word lists every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        reloaded = await workers.pool.run(wordle.reload_word_lists)
+        if reloaded:
+            print("Reloaded word lists:", ", ".join(reloaded))
+
+
+# Task of watch_word_lists, started on the first on_ready only
+_watch_task = None
+
+
+# Handlers by number of arguments after a game command
+PLAY_HANDLERS = [new_game, take_guess, change_setting, change_setting]
+
+# Handlers by first word of a message
+COMMAND_HANDLERS = {
+    **dict.fromkeys(COMMANDS, play),
+    **dict.fromkeys(HINT_COMMANDS, give_hint),
+    **dict.fromkeys(REMAINING_COMMANDS, count_remaining),
+}
+
+# Handlers by first word of a message that need the whole message and run on
+# the event loop, they return color and text to respond with
+MESSAGE_COMMAND_HANDLERS = {
+    **dict.fromkeys(RELOAD_COMMANDS, reload_word_lists),
+    **dict.fromkeys(STATS_COMMANDS, show_stats),
+}
+
+# Handlers by the word after a game command, for messages with one more word
+# (where the second word would otherwise be a setting), like MESSAGE_COMMAND_HANDLERS
+MESSAGE_SUBCOMMAND_HANDLERS = {
+    **dict.fromkeys(UPLOAD_COMMANDS, upload_word_list),
+}
+
+# Handlers by name of a setting
+SETTING_HANDLERS = {
+    **dict.fromkeys(WORD_LIST_SETTINGS, set_word_list),
+    **dict.fromkeys(GUESS_LIST_SETTINGS, set_guess_list),
+    **dict.fromkeys(ALPHABET_SETTINGS, set_alphabet),
+    **dict.fromkeys(LENGTH_SETTINGS, set_length),
+    **dict.fromkeys(MODE_SETTINGS, set_mode),
+    **dict.fromkeys(BOARD_SETTINGS, set_boards),
+}
+
+
+def timed_parse_message(message):
+    """parse_message, timed as its own stage. Returns its response and the channel's
+    state (None if the message was ignored), after marking the state as changed,
+    so the event loop doesn't have to look up or serialize the state"""
+    with metrics.span("parse"):
+        response = parse_message(message)
+    if response[0] is None:
+        return response, None
+    # Loaded by parse_message just now
+    wordle_state = wordle_states.get(message.channel.id)
+    wordle_states.mark_changed(message.channel.id, wordle_state)
+    return response, wordle_state
+
+
+def send_embed(
+    channel,
+    title,
+    color,
+    description,
+    url=None,
+    file=None,
+    replaceable=False,
+    wordle_state=None,
+):
+    """Queues an embed to be sent to the specified channel, replaceable embeds
+    are dropped if a newer board is queued before they are sent.
+    The footer shows the settings of wordle_state if it's given"""
     embed = discord.Embed(
         title=title,
         colour=color,
         description=description,
     )
-    length_string = f"{wordle_states[channel].min_length if wordle_states[channel].min_length == wordle_states[channel].max_length else str(wordle_states[channel].min_length) + '-' + str(wordle_states[channel].max_length)}"
-    embed.set_footer(
-        text=f"Wortlerino v{VERSION} - ({wordle_states[channel].word_list['name']}/{wordle_states[channel].guess_list['name']}/{length_string})"
-    )
+    if wordle_state is None:
+        embed.set_footer(text=f"Wortlerino v{VERSION}")
+    else:
+        length_string = f"{wordle_state.min_length if wordle_state.min_length == wordle_state.max_length else str(wordle_state.min_length) + '-' + str(wordle_state.max_length)}"
+        embed.set_footer(
+            text=f"Wortlerino v{VERSION} - ({wordle_state.word_list['name']}/{wordle_state.guess_list['name']}/{length_string})"
+        )
     if url:
         embed.url = url
 
     if file is not None:
         embed.set_image(url=f"attachment://{file.filename}")
 
-    await channel.send(embed=embed, file=file)
+    return sending.scheduler.send(channel, embed, file, replaceable)
 
 
 @client.event
 async def on_ready():
-    """Connected to discord"""
+    """Connected to discord (again after reconnecting if the session couldn't be
+    resumed, background tasks are only started the first time)"""
+    global _watch_task
     print("Ready.")
     print("Name:", client.user.name)
     print("ID:", client.user.id)
     print()
+    warmup.warmup.start()
+    if workers.WORKER_STATS_INTERVAL:
+        workers.pool.start_printing_stats(workers.WORKER_STATS_INTERVAL)
+    wordle_states.start_flushing(state_store.STATE_FLUSH_INTERVAL)
+    game_stats.stats.start_flushing(
+        game_stats.STATS_FLUSH_INTERVAL,
+        game_stats.STATS_COMPACT_INTERVAL,
+        game_stats.STATS_EVENT_RETENTION,
+    )
+    metrics.start()
+    if word_lists.WORD_LIST_WATCH_INTERVAL and _watch_task is None:
+        _watch_task = asyncio.get_running_loop().create_task(
+            watch_word_lists(word_lists.WORD_LIST_WATCH_INTERVAL)
+        )
 
 
 @client.event
 async def on_message(message):
     """When a message is sent"""
 
-    file = None
-    won, color, response, *rest = parse_message(message)
-    if rest:
-        file = rest[0]
-
-    if won is not None:
-        print("Parsed message:", message.content)
-        if won:
-            await send_embed(
-                message.channel,
-                wordle_states[message.channel].game.word.upper(),
-                color,
-                response,
-                WIKILINK.replace(
-                    "XX", wordle_states[message.channel].word_list["language"]
-                )
-                + wordle_states[message.channel].game.word.title(),
-                file=file,
+    command = get_command(message)
+    if command is None:
+        return
+
+    handler = get_message_handler(command, message)
+    if handler is not None:
+        metrics.messages.inc()
+        color, response = await handler(message)
+        if response is not None:
+            send_embed(message.channel, "", color, response)
+        return
+
+    # Messages of a channel are handled one after another, in order,
+    # the game logic and rendering run in the worker pool,
+    # responses are sent in the background (see sending.py)
+    async with workers.channel_locks.get(message.channel):
+        file = None
+        metrics.messages.inc()
+        with metrics.span("handle"):
+            (won, color, response, *rest), wordle_state = await workers.pool.run(
+                timed_parse_message, message
             )
-        else:
-            await send_embed(message.channel, "", color, response, file=file)
+        if rest:
+            file = rest[0]
+
+        if won is not None:
+            print("Parsed message:", message.content)
+            if won:
+                words = wordle_state.game.words
+                send_embed(
+                    message.channel,
+                    " ".join(words).upper(),
+                    color,
+                    response,
+                    (
+                        WIKILINK.replace("XX", wordle_state.word_list["language"])
+                        + words[0].title()
+                        if len(words) == 1 and wordle_state.word_list["language"]
+                        else None
+                    ),
+                    file=file,
+                    wordle_state=wordle_state,
+                )
+            else:
+                send_embed(
+                    message.channel,
+                    "",
+                    color,
+                    response,
+                    file=file,
+                    replaceable=file is not None,
+                    wordle_state=wordle_state,
+                )
 
 
 # Start the whole thing
-client.run(TOKEN)
+if __name__ == "__main__":
+    try:
+        client.run(config.TOKEN)
+    finally:
+        # Write what's still buffered, even if the bot stopped with an error
+        try:
+            wordle_states.close()
+        finally:
+            game_stats.stats.close()